@@ -29,7 +29,7 @@ import traceback
 from flask.ext import script
 
 import yatel
-from yatel import db, tests, server, etl, qbj
+from yatel import db, tests, server, etl, qbj, weight
 from yatel import yio
 
 
@@ -295,6 +295,56 @@ class Copy(script.Command):
         database_to.confirm_changes()
 
 
+@command("buildedges")
+class BuildEdges(script.Command):
+    """Copy the haplotypes and facts of a Yatel network to another database
+    and creates the edges with the weights calculated by a calculator.
+
+    """
+    option_list = [
+        script.Option(
+            dest='database_from', type=Database(db.MODE_READ),
+            help="Connection string to database according to the RFC 1738 spec."
+        ),
+        script.Option(
+            dest='database_to', type=Database(db.MODE_WRITE),
+            help="Connection string to database according to the RFC 1738 spec."
+        ),
+        script.Option(
+            dest='calcname', choices=sorted(weight.CALCULATORS.keys()),
+            help="Weight calculator name."
+        ),
+        script.Option(
+            "--to-same", dest='to_same', action="store_true", default=False,
+            help=("Creates the edges between the same haplotype "
+                  "(not with --max-weight or --k).")
+        ),
+        script.Option(
+            "--max-weight", dest='max_weight', type=float, default=None,
+            help="Only creates the edges with weight lower or equal."
+        ),
+        script.Option(
+            "--k", dest='k', type=int, default=None,
+            help="Only connects every haplotype with the k nearest neighbours."
+        ),
+        script.Option(
+            "--jobs", dest='n_jobs', type=int, default=1,
+            help=("Number of processes used to compute the weights "
+                  "(not with --max-weight or --k).")
+        )
+    ]
+
+    def run(self, database_from, database_to, calcname, to_same,
+            max_weight, k, n_jobs):
+        database_to.add_elements(database_from.haplotypes())
+        database_to.add_elements(database_from.facts())
+        weight.build_edges(
+            calcname, database_from, database_to, to_same=to_same,
+            max_weight=max_weight, k=k, n_jobs=n_jobs
+        )
+        database_to.confirm_changes()
+
+
 @command("createconf")
 class CreateConf(script.Command):
     """Creates a new configuration file for Yatel.
@@ -26,18 +26,41 @@ For more information about kmeans:
 # IMPORTS
 # =============================================================================
 
+import multiprocessing
+
 import numpy as np
+from scipy import sparse as sp
 from scipy.cluster import vq
 
 from yatel import db
 
 
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+#: Default number of observations used on every iteration of
+#: `minibatch_kmeans`
+BATCH_SIZE = 100
+
+#: Default max number of iterations of `minibatch_kmeans`
+MAX_ITER = 100
+
+#: Default min movement of the centroids to continue the iterations of
+#: `minibatch_kmeans`
+TOL = 0.0
+
+#: Number of environments sended to the executor of `parallel_coords` in
+#: every task (every task opens his own network)
+EXECUTOR_CHUNK_SIZE = 100
+
+
 # =============================================================================
 # KMEANS
 # =============================================================================
 
-def kmeans(nw, envs, k_or_guess,
-           whiten=False, coordc=None, *args, **kwargs):
+def kmeans(nw, envs, k_or_guess, whiten=False, coordc=None, n_jobs=1,
+           executor=None, *args, **kwargs):
     """Performs k-means on a set of all environments defined by `fact_attrs`
     of a network.
 
@@ -69,6 +92,12 @@ def kmeans(nw, envs, k_or_guess,
 
         and must return an array of coordinates for the given
         network environment.
+    n_jobs : int
+        Number of processes used to calculate the coordinates of
+        ``coordc`` (see: `nw2obs`).
+    executor : None or object
+        Used instead of the ``n_jobs`` pool to calculate the coordinates
+        (see: `nw2obs`).
     args : arguments for scipy kmeans
     kwargs : keywords arguments for scipy kmeans
 
@@ -113,12 +142,157 @@ def kmeans(nw, envs, k_or_guess,
      0.0)
 
     """
-    obs = nw2obs(nw, envs, coordc=coordc)
+    obs = nw2obs(nw, envs, coordc=coordc, n_jobs=n_jobs, executor=executor)
     codebook, distortion = vq.kmeans(obs=obs, k_or_guess=k_or_guess,
                                      *args, **kwargs)
     return codebook, distortion
 
 
+def minibatch_kmeans(nw, envs, k_or_guess, batch_size=BATCH_SIZE,
+                     max_iter=MAX_ITER, seed=None, whiten=False, coordc=None,
+                     sparse=True, n_jobs=1, executor=None):
+    """Performs a mini-batch k-means on a set of environments of a network
+    (see: `minibatch_vq`).
+
+    Unlike `kmeans` the observation matrix is a ``scipy.sparse.csr_matrix``
+    (the environment x haplotype matrix is almost all zeros) and only
+    ``batch_size`` observations are used to update the centroids on every
+    iteration.
+
+    Parameters
+    ----------
+    nw : :py:class:`yatel.db.YatelNetwork`
+        Network source of environments to classify.
+    envs : iterable of :py:class:`yatel.dom.Environments` or dicts
+        Represents all the environments to be clustered.
+    k_or_guess : int or ndarray
+        The number of centroids to generate or a k by N array with the
+        initial centroids.
+    batch_size : int
+        Number of observations used on every iteration.
+    max_iter : int
+        Max number of iterations.
+    seed : None or int
+        Seed of the random numbers generator (the same seed always gives
+        the same result).
+    whiten : bool
+        Scale every dimension of the observations by their standard
+        deviation (like ``scipy.cluster.vq.whiten``).
+    coordc : None or callable
+        The coordinates calculator (see: `nw2obs`).
+    sparse : bool
+        If is ``False`` the observation matrix is a dense numpy array.
+    n_jobs : int
+        Number of processes used to calculate the coordinates with
+        ``coordc`` (see: `nw2obs`).
+    executor : None or object
+        Executor used to calculate the coordinates with ``coordc`` (see:
+        `nw2obs`).
+
+    Returns
+    -------
+    coodebook : an array kxn of k centroids
+        The i'th centroid codebook[i] is represented with the code i.
+    distortion : the value of the distortion
+        The mean euclidean distance between the observations and their
+        closest centroid.
+    labels : an array of N codes
+        The code of the closest centroid of every environment.
+
+    Examples
+    --------
+    >>> codebook, distortion, labels = kmeans.minibatch_kmeans(
+    ...     nw, nw.environments(["att0", "att2"]), 2, seed=42)
+    >>> labels
+    array([0, 1, 1])
+
+    """
+    obs = nw2obs(
+        nw, envs, whiten=whiten, coordc=coordc, sparse=sparse,
+        n_jobs=n_jobs, executor=executor
+    )
+    return minibatch_vq(
+        obs, k_or_guess, batch_size=batch_size, max_iter=max_iter, seed=seed
+    )
+
+
+def minibatch_vq(obs, k_or_guess, batch_size=BATCH_SIZE, max_iter=MAX_ITER,
+                 seed=None, tol=TOL):
+    """Mini-batch k-means over a dense or sparse observation matrix.
+
+    On every iteration ``batch_size`` random observations are assigned to
+    their closest centroid and every centroid is moved to the running mean
+    of all the observations assigned to it (Sculley, "Web-scale k-means
+    clustering", 2010).
+
+    Parameters
+    ----------
+    obs : ndarray or ``scipy.sparse`` matrix
+        A M by N array with an observation by row.
+    k_or_guess : int or ndarray
+        The number of centroids to generate (choosed randomly from the
+        observations) or a k by N array with the initial centroids.
+    batch_size : int
+        Number of observations used on every iteration.
+    max_iter : int
+        Max number of iterations.
+    seed : None or int
+        Seed of the random numbers generator.
+    tol : float
+        Stop when no centroid moves more than this distance in an
+        iteration.
+
+    Returns
+    -------
+    tuple
+        Like ``codebook, distortion, labels`` (see: `minibatch_kmeans`).
+
+    """
+    obs = sp.csr_matrix(obs, dtype=np.float64) if sp.issparse(obs) \
+        else np.asarray(obs, dtype=np.float64)
+    n_obs = obs.shape[0]
+    if n_obs == 0:
+        raise ValueError("There is no observations to cluster")
+    rand = np.random.RandomState(seed)
+
+    if np.ndim(k_or_guess) == 0:
+        k = int(k_or_guess)
+        if k < 1 or k > n_obs:
+            raise ValueError(
+                "k must be between 1 and the number of observations"
+            )
+        codebook = _dense(obs[rand.choice(n_obs, k, replace=False)])
+    else:
+        codebook = np.array(k_or_guess, dtype=np.float64)
+    counts = np.zeros(len(codebook))
+
+    for _ in xrange(max_iter):
+        batch = obs[rand.randint(0, n_obs, min(batch_size, n_obs))]
+        labels, _ = _assign(batch, codebook)
+        assigned = sp.csr_matrix((
+            np.ones(len(labels)), (labels, np.arange(len(labels)))
+        ), shape=(len(codebook), len(labels)))
+        sums = _dense(assigned.dot(batch))
+        nassigned = np.bincount(labels, minlength=len(codebook))
+        moved = nassigned > 0
+        counts[moved] += nassigned[moved]
+        old = codebook[moved]
+        codebook[moved] += (
+            sums[moved] - nassigned[moved][:, None] * old
+        ) / counts[moved][:, None]
+        shift = np.sqrt(((codebook[moved] - old) ** 2).sum(axis=1))
+        if shift.max() <= tol:
+            break
+
+    labels, dists = [], []
+    for start in xrange(0, n_obs, batch_size):
+        blabels, bdists = _assign(obs[start:start + batch_size], codebook)
+        labels.append(blabels)
+        dists.append(bdists)
+    labels, dists = np.concatenate(labels), np.concatenate(dists)
+    return codebook, dists.mean(), labels
+
+
 # =============================================================================
 # SUPPORT
 # =============================================================================
@@ -145,13 +319,48 @@ def hap_in_env_coords(nw, env):
 
     """
     haps_id = [hap.hap_id for hap in nw.haplotypes()]
-    ehid = [hap.hap_id for hap in nw.haplotypes_by_environment(env=env)]
+    ehid = set(hap.hap_id for hap in nw.haplotypes_by_environment(env=env))
     haps_id.sort()
-    ehid.sort()
     return [int(hid in ehid) for hid in haps_id]
 
 
-def nw2obs(nw, envs, whiten=False, coordc=None):
+def hap_in_envs_matrix(nw, envs, sparse=False):
+    """Generates the coordinates of `hap_in_env_coords` for all the
+    environments at once, reading the haplotypes of every environment with
+    a single query (see:
+    :py:meth:`yatel.db.YatelNetwork.haplotypes_ids_by_environments`).
+
+    Parameters
+    ----------
+    nw : :py:class:`yatel.db.YatelNetwork`
+    envs : iterable of :py:class:`yatel.dom.Enviroment` or dicts
+    sparse : bool
+        If is ``True`` returns a ``scipy.sparse.csr_matrix``.
+
+    Returns
+    -------
+    array : N by M array
+        The I'th row has the coordinates of the I'th environment.
+
+    """
+    haps_id = sorted(hap.hap_id for hap in nw.haplotypes())
+    columns = dict((hid, idx) for idx, hid in enumerate(haps_id))
+    envs_haps_id = nw.haplotypes_ids_by_environments(envs)
+    rows, cols = [], []
+    for row, ehid in enumerate(envs_haps_id):
+        rows.extend([row] * len(ehid))
+        cols.extend(columns[hid] for hid in ehid)
+    shape = (len(envs_haps_id), len(haps_id))
+    if sparse:
+        data = np.ones(len(rows), dtype=int)
+        return sp.csr_matrix((data, (rows, cols)), shape=shape)
+    mtx = np.zeros(shape, dtype=int)
+    mtx[rows, cols] = 1
+    return mtx
+
+
+def nw2obs(nw, envs, whiten=False, coordc=None, sparse=False, n_jobs=1,
+           executor=None):
     """Converts any given environments defined by ``fact_attrs``
     of a network to an observation matrix to cluster with subjacent *scipy kmeans*
 
@@ -176,6 +385,23 @@ def nw2obs(nw, envs, whiten=False, coordc=None):
         and must return an array of coordinates for the given
         network environment.
 
+        If is ``None`` the coordinates of all the environments are
+        readed with a single query (see: `hap_in_envs_matrix`).
+    sparse : bool
+        If is ``True`` the observation matrix is a
+        ``scipy.sparse.csr_matrix``.
+    n_jobs : int
+        If is not ``1`` the coordinates of ``coordc`` are calculated in a
+        pool of ``n_jobs`` processes (``-1`` use all the cpus); every
+        process opens his own read-only :py:class:`yatel.db.YatelNetwork`
+        from the uri of ``nw``.
+    executor : None or object
+        An object with a ``map(func, iterable)`` method that returns the
+        results in order (like ``multiprocessing.Pool`` or
+        ``concurrent.futures.ProcessPoolExecutor``) used instead of the
+        ``n_jobs`` pool. The environments are sended to the executor as
+        dicts, so ``coordc`` must be picklable (a module level function).
+
     Returns
     -------
     obs : a vector of envs
@@ -205,17 +431,147 @@ def nw2obs(nw, envs, whiten=False, coordc=None):
     if not isinstance(nw, db.YatelNetwork):
         msg = "nw must be 'yatel.db.YatelNetwork' instance"
         raise TypeError(msg)
-    coordc = hap_in_env_coords if coordc is None else coordc
-    mtx = []
-    for env in envs:
-        row = coordc(nw, env)
-        mtx.append(row)
-    obs = np.array(mtx)
-    if whiten:
+    if coordc is None:
+        obs = hap_in_envs_matrix(nw, envs, sparse=sparse)
+    elif executor is not None or n_jobs != 1:
+        obs = np.array(
+            parallel_coords(nw, envs, coordc, n_jobs=n_jobs, executor=executor)
+        )
+        if sparse:
+            obs = sp.csr_matrix(obs)
+    else:
+        obs = np.array([coordc(nw, env) for env in envs])
+        if sparse:
+            obs = sp.csr_matrix(obs)
+    if whiten and sparse:
+        obs = _sparse_whiten(obs)
+    elif whiten:
         obs = vq.whiten(obs)
     return obs
 
 
+def parallel_coords(nw, envs, coordc, n_jobs=-1, executor=None):
+    """Calculates ``coordc`` for every environment of ``envs`` in parallel
+    worker processes.
+
+    Every worker of the pool opens (only once) his own read-only
+    :py:class:`yatel.db.YatelNetwork` from the uri of ``nw``, so ``nw`` can't
+    be an in-memory network. With an ``executor`` the environments are
+    sended in chunks of ``EXECUTOR_CHUNK_SIZE`` and every task opens the
+    network only for his chunk.
+
+    Parameters
+    ----------
+    nw : :py:class:`yatel.db.YatelNetwork`
+    envs : iterable of :py:class:`yatel.dom.Enviroment` or dicts
+    coordc : callable
+        The coordinates calculator (see: `nw2obs`).
+    n_jobs : int
+        Number of processes of the pool (``-1`` use all the cpus).
+    executor : None or object
+        If is not ``None`` an object with a ``map(func, iterable)``
+        method used instead of the pool (see: `nw2obs`).
+
+    Returns
+    -------
+    list
+        The coordinates of every environment in the same order of
+        ``envs``.
+
+    """
+    if nw.uri == db.ENGINE_URIS["memory"]:
+        msg = "The coordinates of an in-memory network can't be parallelized"
+        raise ValueError(msg)
+    if executor is not None:
+        envs = [dict(env) for env in envs]
+        tasks = [
+            (nw.uri, coordc, envs[idx:idx + EXECUTOR_CHUNK_SIZE])
+            for idx in xrange(0, len(envs), EXECUTOR_CHUNK_SIZE)
+        ]
+        coords = []
+        for chunk in executor.map(_chunk_coords, tasks):
+            coords.extend(chunk)
+        return coords
+
+    envs = tuple(envs)
+    n_jobs = multiprocessing.cpu_count() if n_jobs < 0 else n_jobs
+    pool = multiprocessing.Pool(
+        n_jobs, initializer=_init_coords_worker,
+        initargs=(nw.uri, coordc, envs)
+    )
+    try:
+        coords = pool.map(_idx_coords, xrange(len(envs)))
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return coords
+
+
+# the state of every worker process of a parallel_coords pool:
+# (network, coordc, envs); lives until the pool is terminated
+_coords_worker = None
+
+
+def _read_network(uri):
+    """Opens the network of ``uri`` in read mode."""
+    return db.YatelNetwork(**db.parse_uri(uri, mode=db.MODE_READ))
+
+
+def _init_coords_worker(uri, coordc, envs):
+    global _coords_worker
+    _coords_worker = (_read_network(uri), coordc, envs)
+
+
+def _idx_coords(idx):
+    """The coordinates of the ``idx`` environment of the pool."""
+    nw, coordc, envs = _coords_worker
+    return coordc(nw, envs[idx])
+
+
+def _chunk_coords(task):
+    """The coordinates of a chunk of environments sended to an executor."""
+    uri, coordc, envs = task
+    nw = _read_network(uri)
+    return [coordc(nw, env) for env in envs]
+
+
+def _dense(mtx):
+    """A dense numpy array of a dense or sparse matrix."""
+    return mtx.toarray() if sp.issparse(mtx) else np.asarray(mtx)
+
+
+def _assign(obs, codebook):
+    """The code of the closest centroid of every observation and the
+    euclidean distance to it.
+
+    """
+    obs_sq = np.asarray(
+        obs.multiply(obs).sum(axis=1) if sp.issparse(obs)
+        else (obs * obs).sum(axis=1)
+    ).ravel()
+    code_sq = (codebook * codebook).sum(axis=1)
+    dists = _dense(obs.dot(codebook.T)) * -2
+    dists += obs_sq[:, None]
+    dists += code_sq[None, :]
+    labels = dists.argmin(axis=1)
+    mins = dists[np.arange(len(labels)), labels]
+    return labels, np.sqrt(np.maximum(mins, 0))
+
+
+def _sparse_whiten(obs):
+    """Like ``scipy.cluster.vq.whiten`` for a ``scipy.sparse`` matrix
+    (the columns with standard deviation 0 are not scaled).
+
+    """
+    obs = obs.astype(np.float64)
+    mean = np.asarray(obs.mean(axis=0)).ravel()
+    sqmean = np.asarray(obs.multiply(obs).mean(axis=0)).ravel()
+    std_dev = np.sqrt(np.maximum(sqmean - mean ** 2, 0))
+    std_dev[std_dev == 0] = 1.0
+    return sp.csr_matrix(obs.multiply(1.0 / std_dev))
+
+
 # =============================================================================
 # MAIN
 # =============================================================================
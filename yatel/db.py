@@ -28,10 +28,13 @@
 # IMPORTS
 #===============================================================================
 
-import uuid
 import datetime
 import string
 import decimal
+import weakref
+import collections
+
+import numpy as np
 
 import sqlalchemy as sa
 from sqlalchemy import sql
@@ -120,6 +123,23 @@ EDGES = "edges"
 #: A collection with the 3 table names
 TABLES = (HAPLOTYPES, FACTS, EDGES)
 
+#: The name of the table with the haplotypes of every edge (only exists in
+#: networks with the :py:data:`yatel.db.EDGES_MEMBERS` layout)
+EDGE_MEMBERS = "edge_members"
+
+# EDGES LAYOUTS
+
+#: Constant of the layout that stores the haplotypes of every edge in the
+#: ``hap_0 ... hap_N`` columns of the edges table
+EDGES_WIDE = "wide"
+
+#: Constant of the layout that stores the haplotypes of every edge as rows
+#: ``(edge_id, position, hap_id)`` of the edge members table
+EDGES_MEMBERS = "members"
+
+#: The 2 layouts to store the edges
+EDGES_LAYOUTS = (EDGES_WIDE, EDGES_MEMBERS)
+
 # MODES
 
 #: Constant of read-only mode
@@ -134,6 +154,29 @@ MODE_APPEND = "a"
 #: The 3 modes to open the databases
 MODES = (MODE_READ, MODE_WRITE, MODE_APPEND)
 
+#: How many elements of the same type are buffered in memory before being
+#: flushed to the database with a single ``executemany``
+CHUNK_SIZE = 10000
+
+#: How many rows are fetched from the database cursor at once by the read
+#: iterators
+FETCH_SIZE = 1000
+
+#: Max size in bytes of the weight arrays cached by every network
+WEIGHTS_CACHE_SIZE = 64 * 1024 * 1024
+
+# INDEX POLICIES
+
+#: Constant of the index policy that indexes every attribute
+INDEX_ALL = "all"
+
+#: Constant of the index policy that indexes no attribute
+INDEX_NONE = "none"
+
+#: The aggregates over the edges weights that can be computed by the
+#: database (see :py:meth:`yatel.db.YatelNetwork.weights_aggregates`)
+WEIGHTS_AGGREGATES = ("count", "sum", "min", "max", "avg", "var")
+
 
 #===============================================================================
 # ERROR
@@ -144,6 +187,83 @@ class YatelNetworkError(Exception):
     pass
 
 
+#===============================================================================
+# CACHE
+#===============================================================================
+
+class WeightsCache(object):
+    """LRU cache of the weight arrays of a network by environment.
+
+    The cache holds arrays up to ``max_bytes`` bytes; when is full the
+    least recently used arrays are discarded. The cached arrays are
+    read-only.
+
+    """
+
+    def __init__(self, max_bytes=WEIGHTS_CACHE_SIZE):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._arrays = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._arrays)
+
+    def __contains__(self, env):
+        return self.env_key(env) in self._arrays
+
+    def env_key(self, env):
+        """The normalized (hashable and order independent) key of a
+        environment.
+
+        """
+        return tuple(sorted(env.items()))
+
+    def get(self, env):
+        """Return the array of the environment or ``None`` if is not
+        cached.
+
+        """
+        key = self.env_key(env)
+        arr = self._arrays.pop(key, None)
+        if arr is not None:
+            self._arrays[key] = arr
+        return arr
+
+    def put(self, env, arr):
+        """Store the array of the environment (if fits in the cache)."""
+        key = self.env_key(env)
+        old = self._arrays.pop(key, None)
+        if old is not None:
+            self.nbytes -= old.nbytes
+        if arr.nbytes > self.max_bytes:
+            return
+        arr.flags.writeable = False
+        while self._arrays and self.nbytes + arr.nbytes > self.max_bytes:
+            self.nbytes -= self._arrays.popitem(last=False)[1].nbytes
+        self._arrays[key] = arr
+        self.nbytes += arr.nbytes
+
+    def clear(self):
+        """Remove all the arrays of the cache."""
+        self._arrays.clear()
+        self.nbytes = 0
+
+
+#: The weight caches of the networks in read mode by uri; all the caches of
+#: an uri are cleared when the uri is opened in write or append mode and
+#: when its changes are confirmed.
+_weights_caches = collections.defaultdict(weakref.WeakSet)
+
+
+def _clear_weights_caches(uri):
+    """Clear all the registered weight caches of the networks of ``uri``
+    (the networks stay registered).
+
+    """
+    for cache in list(_weights_caches.get(uri, ())):
+        cache.clear()
+
+
 #===============================================================================
 # NETWORK
 #===============================================================================
@@ -154,7 +274,11 @@ class YatelNetwork(object):
     
     """
     
-    def __init__(self, engine, mode=MODE_READ, log=None, **kwargs):
+    def __init__(self, engine, mode=MODE_READ, log=None,
+                 chunk_size=CHUNK_SIZE, indexes=INDEX_ALL,
+                 defer_indexes=False, edges_layout=EDGES_WIDE,
+                 fetch_size=FETCH_SIZE, weights_cache_size=WEIGHTS_CACHE_SIZE,
+                 **kwargs):
         """Creates a new instance.
 
         Parameters
@@ -167,10 +291,39 @@ class YatelNetwork(object):
                 existing yatel collections in the database.
                 - If mode is **w** yatell will destroy all the
                 collections.
-                - If mode is **a** all the elements are copied to a temporal
-                table and the network is ready to accept more elements
+                - If mode is **a** the network is ready to accept more
+                elements, which are inserted in the existing collections.
         log : None or bool
             Print the log of the backend to the standar output
+        chunk_size : int
+            Only for **w** and **a** modes. How many elements of the same
+            type are buffered in memory before being written to the
+            database in a single bulk insert.
+        indexes : str or iterable
+            Only for **w** and **a** modes. Which haplotype and fact
+            attributes are indexed: :py:data:`yatel.db.INDEX_ALL`,
+            :py:data:`yatel.db.INDEX_NONE` or a collection of attribute
+            names. The ``hap_id`` and edges columns are always indexed.
+        defer_indexes : bool
+            Only for **w** and **a** modes. If is ``True`` the tables are
+            created without secondary indexes and all the indexes are built
+            by ``confirm_changes`` after the data is loaded.
+        edges_layout : str
+            Only for **w** mode. How the haplotypes of the edges are stored:
+            :py:data:`yatel.db.EDGES_WIDE` (one column per node) or
+            :py:data:`yatel.db.EDGES_MEMBERS` (one row per node in an
+            indexed table, better for networks with big hyperedges). In
+            **r** and **a** modes the layout of the existing network is
+            used.
+        fetch_size : int
+            How many rows the read iterators fetch from the database at
+            once. The queries run with server side cursors (if the driver
+            support them) so only ``fetch_size`` rows are in memory.
+        weights_cache_size : int
+            Max size in bytes of the cache of weight arrays by environment
+            used by ``weights_array`` (``0`` disable the cache). The cache
+            is cleared when the same database is opened in **w** or **a**
+            mode.
         kwargs : a dict of arguments for the ``engine``.
                 Extra arguments for a given ``engine`` (see :py:data:`yatel.db.ENGINE_VARS`)
 
@@ -219,15 +372,35 @@ class YatelNetwork(object):
 
         self._mode = mode
         self._descriptor = None
+        self._fetch_size = fetch_size
+
+        self._weights_cache = WeightsCache(weights_cache_size)
+        if mode == MODE_READ:
+            _weights_caches[self._uri].add(self._weights_cache)
+        else:
+            _clear_weights_caches(self._uri)
+
+        if mode == MODE_WRITE:
+            if edges_layout not in EDGES_LAYOUTS:
+                msg = "Invalid edges layout '{}'".format(edges_layout)
+                raise ValueError(msg)
+            self._edges_layout = edges_layout
+        elif self._engine.has_table(EDGE_MEMBERS):
+            self._edges_layout = EDGES_MEMBERS
+        else:
+            self._edges_layout = EDGES_WIDE
+        self.edge_members_table = None
 
         if mode == MODE_READ:
             try:
-                self._metadata.reflect(only=TABLES)
+                self._metadata.reflect(only=self._tnames())
             except sa.exc.InvalidRequestError:
                 raise YatelNetworkError("Invalid database")
             self.haplotypes_table = self._metadata.tables[HAPLOTYPES]
             self.facts_table = self._metadata.tables[FACTS]
             self.edges_table = self._metadata.tables[EDGES]
+            if self._edges_layout == EDGES_MEMBERS:
+                self.edge_members_table = self._metadata.tables[EDGE_MEMBERS]
         else:
 
             if mode == MODE_WRITE:
@@ -235,52 +408,235 @@ class YatelNetwork(object):
                 self._metadata.drop_all()
                 self._metadata.clear()
 
+            if indexes not in (INDEX_ALL, INDEX_NONE):
+                indexes = frozenset(indexes)
+            self._indexes = indexes
+            self._defer_indexes = defer_indexes
+            self._index_buff = []
+            self._chunk_size = chunk_size
             self._column_buff = {HAPLOTYPES: [], FACTS: [], EDGES: 0}
-            self._create_objects = sa.Table(
-                "_tmp_yatel_objs_{}".format(uuid.uuid4()), self._metadata,
-                sa.Column("id", sa.Integer(), primary_key=True),
-                sa.Column("tname", sa.String(length=15), nullable=False),
-                sa.Column("data", sa.PickleType(), nullable=False),
-                prefixes=['TEMPORARY'],
-            )
-            self._create_conn = self._metadata.bind.connect()
-            self._create_objects.create(self._create_conn)
-            self._create_trans = self._create_conn.begin()
+            self._elems_buff = dict((tname, []) for tname in self._tnames())
+            self._tables_buff = {}
+            self._last_edge_id = 0
+            self._written = 0
 
             if mode == MODE_APPEND:
-                self._creation_append = True
                 try:
-                    self._metadata.reflect(only=TABLES)
+                    self._metadata.reflect(only=self._tnames())
                 except sa.exc.InvalidRequestError:
                     raise YatelNetworkError("Invalid database")
-                self.haplotypes_table = self._metadata.tables[HAPLOTYPES]
-                self.facts_table = self._metadata.tables[FACTS]
-                self.edges_table = self._metadata.tables[EDGES]
-                self.add_elements(self.haplotypes())
-                self.add_elements(self.facts())
-                self.add_elements(self.edges())
-                self._metadata.drop_all(
-                    self._create_conn,
-                    tables=[self.haplotypes_table,
-                            self.facts_table,
-                            self.edges_table]
-                )
-                self._metadata.remove(self.haplotypes_table)
-                self._metadata.remove(self.facts_table)
-                self._metadata.remove(self.edges_table)
-                del self.haplotypes_table
-                del self.facts_table
-                del self.edges_table
-                del self._creation_append
+                # the new elements are inserted in the existing tables
+                for tname in self._tnames():
+                    table = self._metadata.tables[tname]
+                    self._tables_buff[tname] = table
+                    if tname == EDGE_MEMBERS:
+                        continue
+                    elif tname == EDGES:
+                        self._last_edge_id = self._engine.execute(
+                            sql.select([sa.func.max(table.c.id)])
+                        ).scalar() or 0
+                        self._column_buff[EDGES] = len([
+                            k for k in table.c.keys() if k.startswith("hap_")
+                        ])
+                    else:
+                        self._column_buff[tname].extend(
+                            c for c in table.c if c.name != "id"
+                        )
+
+            self._create_conn = self._metadata.bind.connect()
+            self._create_trans = self._create_conn.begin()
 
 
     #===========================================================================
     # PRIVATE
     #===========================================================================
 
-    def _new_attrs(self, attnames, table):
-        columns = [c.name for c in self._column_buff[table]]
-        return set(attnames).difference(columns)
+    def _tnames(self):
+        """The names of all the tables of the network."""
+        if self._edges_layout == EDGES_MEMBERS:
+            return TABLES + (EDGE_MEMBERS,)
+        return TABLES
+
+    def _hap_id_type(self):
+        return [
+            c.type for c in self._column_buff[HAPLOTYPES] if c.name == "hap_id"
+        ][0]
+
+    def _hap_id_columns(self, hap_id):
+        atype = type(hap_id)
+        ctype = SQL_ALCHEMY_TYPES[atype](hap_id)
+        if isinstance(ctype, sa.Text):
+            ctype = sa.String(500)
+        extra_params = {}
+        if isinstance(ctype, sa.Integer):
+            extra_params["autoincrement"] = False
+        columns = [
+            sa.Column("hap_id", ctype, primary_key=True, **extra_params),
+            sa.Column("hap_id", ctype,
+                      sa.ForeignKey('{}.hap_id'.format(HAPLOTYPES)),
+                      nullable=False)
+        ]
+        self._column_buff[HAPLOTYPES].append(columns[0])
+        self._column_buff[FACTS].append(columns[1])
+        self._index_buff.extend(columns)
+
+    def _must_index(self, aname):
+        if self._indexes == INDEX_ALL:
+            return True
+        elif self._indexes == INDEX_NONE:
+            return False
+        return aname in self._indexes
+
+    def _new_columns(self, tname, rows):
+        """Infer the columns of the attributes seen for the first time in a
+        chunk of rows of the table ``tname``.
+
+        """
+        if tname == EDGE_MEMBERS or \
+           (tname == EDGES and self._edges_layout == EDGES_MEMBERS):
+            return []
+
+        elif tname == EDGES:
+            max_nodes = self._column_buff[EDGES]
+            for row in rows:
+                # all the keys but weight are hap_N
+                max_nodes = max(max_nodes, len(row) - 1)
+            columns = [
+                sa.Column("hap_{}".format(idx), self._hap_id_type(),
+                          sa.ForeignKey(HAPLOTYPES + '.hap_id'),
+                          nullable=True)
+                for idx in range(self._column_buff[EDGES], max_nodes)
+            ]
+            self._column_buff[EDGES] = max_nodes
+            self._index_buff.extend(columns)
+            return columns
+
+        known = set(c.name for c in self._column_buff[tname])
+        columns = []
+        for row in rows:
+            for aname, avalue in row.items():
+                if aname not in known:
+                    atype = type(avalue)
+                    ctype = SQL_ALCHEMY_TYPES[atype](avalue)
+                    column = sa.Column(aname, ctype, nullable=True)
+                    columns.append(column)
+                    known.add(aname)
+                    if self._must_index(aname):
+                        self._index_buff.append(column)
+        self._column_buff[tname].extend(columns)
+        return columns
+
+    def _add_column(self, table, column):
+        table.append_column(column)
+        ddl = "ALTER TABLE {table} ADD COLUMN {column}".format(
+            table=self._create_conn.dialect.identifier_preparer.format_table(
+                table
+            ),
+            column=sa.schema.CreateColumn(column).compile(
+                dialect=self._create_conn.dialect
+            )
+        )
+        self._create_conn.execute(ddl)
+
+    def _create_indexes(self):
+        """Creates the indexes of all the buffered columns that already
+        belongs to a table.
+
+        """
+        pending = []
+        for column in self._index_buff:
+            if column.table is None:
+                pending.append(column)
+            else:
+                name = "ix_{}_{}".format(column.table.name, column.name)
+                sa.Index(name, column).create(self._create_conn)
+        self._index_buff = pending
+
+    def _sync_table(self, tname, rows):
+        """Returns the table ``tname`` creating it or adding the new columns
+        needed to store ``rows``.
+
+        """
+        if tname != HAPLOTYPES and HAPLOTYPES not in self._tables_buff:
+            self._sync_table(HAPLOTYPES, ())
+        if tname == EDGE_MEMBERS and EDGES not in self._tables_buff:
+            self._sync_table(EDGES, ())
+
+        columns = self._new_columns(tname, rows)
+        table = self._tables_buff.get(tname)
+        if table is None:
+            if tname == HAPLOTYPES:
+                table = sa.Table(
+                    HAPLOTYPES, self._metadata, *self._column_buff[HAPLOTYPES]
+                )
+            elif tname == FACTS:
+                table = sa.Table(
+                    FACTS, self._metadata,
+                    sa.Column("id", sa.Integer(), primary_key=True),
+                    *self._column_buff[FACTS]
+                )
+            elif tname == EDGES:
+                table = sa.Table(
+                    EDGES, self._metadata,
+                    sa.Column("id", sa.Integer(), primary_key=True),
+                    sa.Column("weight", sa.Float(), nullable=False),
+                    *columns
+                )
+            else:
+                hap_id = sa.Column(
+                    "hap_id", self._hap_id_type(),
+                    sa.ForeignKey(HAPLOTYPES + '.hap_id'), nullable=False
+                )
+                table = sa.Table(
+                    EDGE_MEMBERS, self._metadata,
+                    sa.Column("edge_id", sa.Integer(),
+                              sa.ForeignKey(EDGES + '.id'), primary_key=True),
+                    sa.Column("position", sa.Integer(), primary_key=True,
+                              autoincrement=False),
+                    hap_id
+                )
+                self._index_buff.append(hap_id)
+            table.create(self._create_conn)
+            self._tables_buff[tname] = table
+        else:
+            for column in columns:
+                self._add_column(table, column)
+        if not self._defer_indexes:
+            self._create_indexes()
+        return table
+
+    def _buffer(self, tname, data):
+        buff = self._elems_buff[tname]
+        buff.append(data)
+        if len(buff) >= self._chunk_size:
+            # the facts and edges reference the haplotypes, so all the
+            # buffers are written in the order of the tables
+            for name in self._tnames():
+                if self._elems_buff[name]:
+                    self._written += self._flush(name)
+
+    def _flush(self, tname):
+        """Writes all the buffered rows of the table ``tname`` with a single
+        ``executemany`` and returns how many rows were written.
+
+        """
+        rows = self._elems_buff[tname]
+        try:
+            table = self._sync_table(tname, rows)
+            if rows:
+                names = [k for k in table.c.keys() if k in rows[0] or k != "id"]
+                self._create_conn.execute(
+                    table.insert(),
+                    [dict((k, row.get(k)) for k in names) for row in rows]
+                )
+        except Exception as err:
+            self._create_trans.rollback()
+            raise err
+        self._elems_buff[tname] = []
+        written = len(rows)
+        if tname == EDGES and self._edges_layout == EDGES_MEMBERS:
+            written += self._flush(EDGE_MEMBERS)
+        return written
 
     def _row2hap(self, row):
         attrs = dict([
@@ -304,6 +660,33 @@ class YatelNetwork(object):
         weight = row["weight"]
         return dom.Edge(weight, haps)
 
+    def _members_edges(self, where=None):
+        """Iterates over the edges of a network with the members layout
+        joining every edge with his haplotypes ordered by position.
+
+        """
+        members = self.edge_members_table
+        query = sql.select(
+            [self.edges_table.c.id, self.edges_table.c.weight,
+             members.c.hap_id]
+        ).select_from(
+            self.edges_table.outerjoin(
+                members, members.c.edge_id == self.edges_table.c.id
+            )
+        ).order_by(self.edges_table.c.id, members.c.position)
+        if where is not None:
+            query = query.where(where)
+        edge_id, weight, haps = None, None, []
+        for row in self._stream(query):
+            if row.id != edge_id:
+                if edge_id is not None:
+                    yield dom.Edge(weight, haps)
+                edge_id, weight, haps = row.id, row.weight, []
+            if row.hap_id is not None:
+                haps.append(row.hap_id)
+        if edge_id is not None:
+            yield dom.Edge(weight, haps)
+
     #===========================================================================
     # DDL METHODS
     #===========================================================================
@@ -354,51 +737,32 @@ class YatelNetwork(object):
         tname = None
 
         # determine the hap_id columns
-        if isinstance(elem, (dom.Haplotype, dom.Fact)) \
-           and not self._column_buff[HAPLOTYPES]:
-                avalue = elem.hap_id
-                atype = type(avalue)
-                ctype = SQL_ALCHEMY_TYPES[atype](avalue)
-                if isinstance(ctype, sa.Text):
-                    ctype = sa.String(500)
-                extra_params = {}
-                if isinstance(ctype, sa.Integer):
-                    extra_params["autoincrement"] = False
-                self._column_buff[HAPLOTYPES].append(
-                    sa.Column("hap_id", ctype,
-                              index=True, primary_key=True, **extra_params)
-                )
-                self._column_buff[FACTS].append(
-                    sa.Column("hap_id", ctype,
-                              sa.ForeignKey('{}.hap_id'.format(HAPLOTYPES)),
-                              index=True, nullable=False)
-                )
+        if not self._column_buff[HAPLOTYPES]:
+            if isinstance(elem, (dom.Haplotype, dom.Fact)):
+                self._hap_id_columns(elem.hap_id)
+            elif isinstance(elem, dom.Edge) and elem.haps_id:
+                self._hap_id_columns(elem.haps_id[0])
 
         if isinstance(elem, dom.Haplotype):
-            new_attrs_names = self._new_attrs(elem.keys(), HAPLOTYPES)
-            for aname in new_attrs_names:
-                avalue = elem[aname]
-                atype = type(avalue)
-                ctype = SQL_ALCHEMY_TYPES[atype](avalue)
-                column = sa.Column(aname, ctype, index=True, nullable=True)
-                self._column_buff[HAPLOTYPES].append(column)
             data = dict(elem)
             tname = HAPLOTYPES
 
         elif isinstance(elem, dom.Fact):
-            new_attrs_names = self._new_attrs(elem.keys(), FACTS)
-            for aname in new_attrs_names:
-                avalue = elem[aname]
-                atype = type(avalue)
-                ctype = SQL_ALCHEMY_TYPES[atype](avalue)
-                column = sa.Column(aname, ctype, index=True, nullable=True)
-                self._column_buff[FACTS].append(column)
             data = dict(elem)
             tname = FACTS
 
+        elif isinstance(elem, dom.Edge) and \
+             self._edges_layout == EDGES_MEMBERS:
+            self._last_edge_id += 1
+            self._elems_buff[EDGE_MEMBERS].extend(
+                {"edge_id": self._last_edge_id, "position": idx,
+                 "hap_id": hap_id}
+                for idx, hap_id in enumerate(elem.haps_id)
+            )
+            data = {"id": self._last_edge_id, "weight": elem.weight}
+            tname = EDGES
+
         elif isinstance(elem, dom.Edge):
-            if len(elem.haps_id) > self._column_buff[EDGES]:
-                self._column_buff[EDGES] = len(elem.haps_id)
             data = {}
             for idx, hap_id in enumerate(elem.haps_id):
                 data["hap_{}".format(idx)] = hap_id
@@ -409,13 +773,22 @@ class YatelNetwork(object):
         else:
             msg = "Object '{}' is not yatel.dom type".format(str(elem))
             raise TypeError(msg)
-        self._create_conn.execute(self._create_objects.insert(),
-                                  tname=tname, data=data)
 
-    def confirm_changes(self):
+        self._buffer(tname, data)
+
+    def confirm_changes(self, progress=None):
         """Creates the subjacent structures to store the elements added
         and changes to read mode.
 
+        Parameters
+        ----------
+        progress : None or callable
+            If is not ``None`` is called after every bulk insert of the rows
+            still buffered with two arguments: the number of rows already
+            written since the network was opened (including the chunks
+            written while the elements were added) and the total number of
+            rows of the load.
+
         Examples
         --------
         >>> from yatel import db, dom
@@ -429,66 +802,47 @@ class YatelNetwork(object):
         if self.mode == MODE_READ:
             raise YatelNetworkError("Network in read-only mode")
 
-        # create te tables
-        self.haplotypes_table = sa.Table(
-            HAPLOTYPES, self._metadata, *self._column_buff[HAPLOTYPES]
-        )
-
-        self.facts_table = sa.Table(
-            FACTS, self._metadata,
-            sa.Column("id", sa.Integer(), primary_key=True),
-            *self._column_buff[FACTS]
-        )
-
-        edges_columns = [
-            sa.Column("hap_{}".format(idx),
-                      self.haplotypes_table.c.hap_id.type,
-                      sa.ForeignKey(HAPLOTYPES + '.hap_id'),
-                      index=True, nullable=True)
-            for idx in range(self._column_buff[EDGES])
-        ]
-        self.edges_table = sa.Table(
-            EDGES, self._metadata,
-            sa.Column("id", sa.Integer(), primary_key=True),
-            sa.Column("weight", sa.Float(), nullable=False),
-            *edges_columns
-        )
-
-        self._metadata.create_all(self._create_conn)
-
+        progress = progress or (lambda done, total: None)
         try:
-            query = sql.select([self._create_objects])
-            for row in self._create_conn.execute(query):
-                table = None
-                if row.tname == HAPLOTYPES:
-                    table = self.haplotypes_table
-                elif row.tname == FACTS:
-                    table = self.facts_table
-                elif row.tname == EDGES:
-                    table = self.edges_table
-                else:
-                    msg = "Invalid tname '{}'".format(row.tname)
-                    raise YatelNetworkError(msg)
-                self._create_conn.execute(table.insert(), **row.data)
+            done = self._written
+            total = done + sum(
+                len(rows) for rows in self._elems_buff.values()
+            )
+            for tname in self._tnames():
+                written = self._flush(tname)
+                if written:
+                    done += written
+                    progress(done, total)
+            self._create_indexes()
         except Exception as err:
             self._create_trans.rollback()
             raise err
         else:
             self._create_trans.commit()
+        # the networks in read mode may have cached the weights while the
+        # changes were not committed
+        _clear_weights_caches(self._uri)
+
+        self.haplotypes_table = self._tables_buff[HAPLOTYPES]
+        self.facts_table = self._tables_buff[FACTS]
+        self.edges_table = self._tables_buff[EDGES]
+        self.edge_members_table = self._tables_buff.get(EDGE_MEMBERS)
 
         # close all tmp references
         self._create_trans.close()
         self._create_conn.close()
 
-        self._metadata.remove(self._create_objects)
-
         # destroys the buffers
         del self._column_buff
-        del self._create_objects
+        del self._elems_buff
+        del self._tables_buff
+        del self._index_buff
         del self._create_conn
         del self._create_trans
+        del self._written
 
         self._mode = MODE_READ
+        _weights_caches[self._uri].add(self._weights_cache)
 
     #===========================================================================
     # QUERIES # use execute here
@@ -503,9 +857,8 @@ class YatelNetwork(object):
             if the network is not in read mode.
 
         """
-        if not getattr(self, "_creation_append", None):
-            if self.mode != MODE_READ:
-                raise YatelNetworkError("Network in {} mode".format(self.mode))
+        if self.mode != MODE_READ:
+            raise YatelNetworkError("Network in {} mode".format(self.mode))
 
     def execute(self, query):
         """Execute a given ``query`` to the backend.
@@ -521,7 +874,66 @@ class YatelNetwork(object):
         self.validate_read()
         return self._engine.execute(query)
 
-    def environments(self, facts_attrs=None):
+    def _stream_batches(self, query):
+        """Iterates over lists of (at most) ``fetch_size`` rows of the
+        ``query`` readed from a server side cursor.
+
+        """
+        self.validate_read()
+        conn = self._engine.connect().execution_options(stream_results=True)
+        try:
+            result = conn.execute(query)
+            try:
+                rows = result.fetchmany(self._fetch_size)
+                while rows:
+                    yield rows
+                    rows = result.fetchmany(self._fetch_size)
+            finally:
+                result.close()
+        finally:
+            conn.close()
+
+    def _stream(self, query):
+        """Iterates over the rows of the ``query`` fetching ``fetch_size``
+        rows at once from a server side cursor.
+
+        """
+        for rows in self._stream_batches(query):
+            for row in rows:
+                yield row
+
+    def _env_edges_where(self, env):
+        """Creates the condition to filter the edges with all their
+        haplotypes in the given environment.
+
+        In both layouts only the edges with ``max_nodes`` haplotypes can
+        be in an environment.
+
+        """
+        subquery = sql.select([self.facts_table.c.hap_id]).where(
+            sql.and_(
+                *[self.facts_table.c[k] == v for k, v in env.items()]
+            )
+        ).distinct()
+        max_nodes = self.describe().edge_attributes["max_nodes"]
+
+        if self._edges_layout == EDGES_MEMBERS:
+            members = self.edge_members_table
+            alias = subquery.alias("env_haps")
+            edges_ids = sql.select([members.c.edge_id]).select_from(
+                members.join(alias, members.c.hap_id == alias.c.hap_id)
+            ).group_by(members.c.edge_id).having(
+                sa.func.count() == max_nodes
+            )
+            return self.edges_table.c.id.in_(edges_ids)
+
+        return sql.and_(*[
+            self.edges_table.c["hap_{}".format(cnt)].in_(subquery)
+            for cnt in range(max_nodes)
+        ])
+
+    def environments(self, facts_attrs=None, with_counts=False,
+                     order_by=None, limit=None, offset=None):
         """Iterates over all combinations of environments of the given attrs.
 
         **REQUIRE MODE:** r
@@ -530,12 +942,28 @@ class YatelNetwork(object):
         ----------
         fact_attrs : iterable
             Collection of existing fact attribute names.
+        with_counts : bool
+            If is ``True`` every environment is returned with the number
+            of haplotypes and facts in it.
+        order_by : None or str
+            ``"count"`` (or ``"haplotypes"``) orders the environments by
+            their number of haplotypes and ``"facts"`` by their number of
+            facts (from the greatest); the name of one of ``fact_attrs``
+            orders by the value of that attribute.
+        limit : None or int
+            Max number of environments to return.
+        offset : None or int
+            Number of environments to skip. If ``limit`` or ``offset`` are
+            used without ``order_by`` the environments are ordered by
+            ``fact_attrs`` to get stable pages.
 
         Returns
         -------
         iterator
             Iterator of dictionaries with all valid combinations of
-            values of a given ``fact_attrs`` names
+            values of a given ``fact_attrs`` names. If ``with_counts`` is
+            ``True`` like ``env, counts`` where ``counts`` is a dict with
+            the keys ``haplotypes`` and ``facts``.
 
         Examples
         --------
@@ -548,25 +976,67 @@ class YatelNetwork(object):
         {u'place': None, u'native': None}
         ...
 
+        >>> for env, counts in nw.environments(
+        ...         ["place"], with_counts=True, order_by="count", limit=2):
+        ...     print env, counts
+        {u'place': u'Hogwarts'} {'haplotypes': 12, 'facts': 40}
+        {u'place': None} {'haplotypes': 9, 'facts': 15}
+
+        """
+        attrs = self._environments_attrs(facts_attrs)
+        env_columns = [self.facts_table.c[k] for k in attrs]
+        haps_count = sa.func.count(sa.distinct(self.facts_table.c.hap_id))
+        facts_count = sa.func.count()
+
+        if with_counts or order_by in ("count", "haplotypes", "facts"):
+            query = sql.select(
+                env_columns + [haps_count, facts_count]
+            ).group_by(*env_columns)
+        else:
+            query = sql.select(env_columns).distinct()
+
+        if order_by in ("count", "haplotypes"):
+            query = query.order_by(haps_count.desc(), *env_columns)
+        elif order_by == "facts":
+            query = query.order_by(facts_count.desc(), *env_columns)
+        elif order_by in attrs:
+            query = query.order_by(self.facts_table.c[order_by], *env_columns)
+        elif order_by is not None:
+            raise ValueError("Invalid order_by '{}'".format(order_by))
+        elif limit is not None or offset is not None:
+            query = query.order_by(*env_columns)
+
+        if limit is not None:
+            query = query.limit(limit)
+        if offset is not None:
+            query = query.offset(offset)
+
+        for row in self._stream(query):
+            row = tuple(row)
+            env = dom.Environment(**dict(zip(attrs, row)))
+            if with_counts:
+                counts = {"haplotypes": row[len(attrs)],
+                          "facts": row[len(attrs) + 1]}
+                yield env, counts
+            else:
+                yield env
+
+    def _environments_attrs(self, facts_attrs=None):
+        """Validates the names of the fact attributes that define the
+        environments (all the fact attributes if is empty).
+
         """
         facts_attrs = facts_attrs or ()
         if "hap_id" in facts_attrs:
             raise ValueError("Invalid fact attr: 'hap_id'")
         if "id" in facts_attrs:
             raise ValueError("Invalid fact attr: 'id'")
-        attrs = None
         if facts_attrs:
-            attrs = facts_attrs
-        else:
-            attrs = tuple(
-                k for k in self.describe()["fact_attributes"].keys()
-                if k != "hap_id"
-            )
-        query = sql.select(
-            [self.facts_table.c[k] for k in attrs]
-        ).distinct()
-        for row in self.execute(query):
-            yield dom.Environment(**row)
+            return tuple(facts_attrs)
+        return tuple(
+            k for k in self.describe()["fact_attributes"].keys()
+            if k != "hap_id"
+        )
 
     #===========================================================================
     # HAPLOTYPE QUERIES
@@ -585,7 +1055,7 @@ class YatelNetwork(object):
 
         """
         query = sql.select([self.haplotypes_table])
-        for row in self.execute(query):
+        for row in self._stream(query):
             yield self._row2hap(row)
 
     def haplotype_by_id(self, hap_id):
@@ -659,9 +1129,64 @@ class YatelNetwork(object):
                 self.facts_table.c.hap_id == self.haplotypes_table.c.hap_id
             )
         ).where(where).distinct()
-        for row in self.execute(query):
+        for row in self._stream(query):
             yield self._row2hap(row)
 
+    def haplotypes_ids_by_environments(self, envs):
+        """The ``hap_id`` of the haplotypes of every environment of ``envs``
+        readed with a single grouped query over the facts.
+
+        **REQUIRE MODE:** r
+
+        Parameters
+        ----------
+        envs : iterable of dict or :py:class:`yatel.dom.Enviroment`
+            Keys are :py:class:`yatel.dom.Fact` attributes name, and value
+            is a possible value of the given attribute.
+
+        Returns
+        -------
+        list
+            Of ``frozenset`` with the ``hap_id`` of the haplotypes of every
+            environment in the same order of ``envs``.
+
+        Examples
+        --------
+        >>> nw.haplotypes_ids_by_environments([{"a": 1}, {"c": "foo"}])
+        [frozenset(['hap1', 'hap2']), frozenset(['hap1'])]
+
+        """
+        # attributes -> values -> indexes of the environments
+        groups = collections.defaultdict(
+            lambda: collections.defaultdict(list)
+        )
+        count = 0
+        for idx, env in enumerate(envs):
+            env = dict(env)
+            attrs = tuple(sorted(env.keys()))
+            values = tuple(env[attr] for attr in attrs)
+            groups[attrs][values].append(idx)
+            count += 1
+        if not count:
+            return []
+
+        haps_ids = [set() for _ in xrange(count)]
+        columns = sorted(set(attr for attrs in groups for attr in attrs))
+        selected = [self.facts_table.c.hap_id] + [
+            self.facts_table.c[column] for column in columns
+        ]
+        query = sql.select(selected).group_by(*selected)
+        positions = [
+            (tuple(columns.index(attr) + 1 for attr in attrs), by_values)
+            for attrs, by_values in groups.items()
+        ]
+        for row in self._stream(query):
+            for pos, by_values in positions:
+                values = tuple(row[p] for p in pos)
+                for idx in by_values.get(values, ()):
+                    haps_ids[idx].add(row[0])
+        return [frozenset(ids) for ids in haps_ids]
+
     #===========================================================================
     # EDGES QUERIES
     #===========================================================================
@@ -678,9 +1203,13 @@ class YatelNetwork(object):
             Iterator of :py:class:`yatel.dom.Edge` instances.
 
         """
-        query = sql.select([self.edges_table])
-        for row in self.execute(query):
-            yield self._row2edge(row)
+        if self._edges_layout == EDGES_MEMBERS:
+            for edge in self._members_edges():
+                yield edge
+        else:
+            query = sql.select([self.edges_table])
+            for row in self._stream(query):
+                yield self._row2edge(row)
 
     def edges_by_environment(self, env=None, **kwargs):
         """Iterates over all :py:class:`yatel.dom.Edge` instances of a given 
@@ -707,20 +1236,14 @@ class YatelNetwork(object):
         env = dict(env) if env else {}
         env.update(kwargs)
 
-        subquery = sql.select([self.facts_table.c.hap_id]).where(
-            sql.and_(
-                *[self.facts_table.c[k] == v for k, v in env.items()]
-            )
-        ).distinct()
-        query = sql.select([self.edges_table]).distinct()
-        for cnt in range(self.describe().edge_attributes["max_nodes"]):
-            alias = subquery.alias("sub_{}".format(cnt))
-            attr = "hap_{}".format(cnt)
-            query = query.select_from(alias).where(
-                self.edges_table.c[attr] == alias.c.hap_id
-            )
-        for row in self.execute(query):
-            yield self._row2edge(row)
+        where = self._env_edges_where(env)
+        if self._edges_layout == EDGES_MEMBERS:
+            for edge in self._members_edges(where):
+                yield edge
+        else:
+            query = sql.select([self.edges_table]).where(where)
+            for row in self._stream(query):
+                yield self._row2edge(row)
 
     def edges_by_haplotype(self, hap):
         """Iterates over all the edges of a given 
@@ -740,13 +1263,274 @@ class YatelNetwork(object):
 
 
         """
+        if self._edges_layout == EDGES_MEMBERS:
+            members = self.edge_members_table
+            edges_ids = sql.select([members.c.edge_id]).where(
+                members.c.hap_id == hap.hap_id
+            )
+            where = self.edges_table.c.id.in_(edges_ids)
+            for edge in self._members_edges(where):
+                yield edge
+            return
+
         where = sql.or_(*[v == hap.hap_id
                           for k, v in self.edges_table.c.items()
                           if k.startswith("hap_")])
         query = sql.select([self.edges_table]).where(where).distinct()
-        for row in self.execute(query):
+        for row in self._stream(query):
             yield self._row2edge(row)
 
+    def weights_array(self, env=None, **kwargs):
+        """Return the weights of all the :py:class:`yatel.dom.Edge` of a given
+        environment (or all the edges if no environment is given).
+
+        Only the weight column is readed from the database and copied
+        directly into the array (no :py:class:`yatel.dom.Edge` is created).
+
+        **REQUIRE MODE:** r
+
+        Parameters
+        ----------
+        env : dict
+            Keys are :py:class:`yatel.dom.Fact` attributes name, and value is
+            a possible value of the given attribute.
+        kwargs : dict
+            Keys are :py:class:`yatel.dom.Fact` attributes name, and value is
+            a possible value of the given attribte.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of ``float64`` with the weights. The arrays are cached by
+            environment (see ``weights_cache_size``) so they are read-only.
+
+        """
+        env = dict(env) if env else {}
+        env.update(kwargs)
+
+        arr = self._weights_cache.get(env)
+        if arr is not None:
+            return arr
+
+        query = sql.select([self.edges_table.c.weight])
+        if env:
+            query = query.where(self._env_edges_where(env))
+        chunks = [
+            np.fromiter((row[0] for row in rows), np.float64, len(rows))
+            for rows in self._stream_batches(query)
+        ]
+        arr = np.concatenate(chunks) if chunks else np.empty(0, np.float64)
+        self._weights_cache.put(env, arr)
+        return arr
+
+    def weights_aggregates(self, aggregates, env=None, **kwargs):
+        """Compute aggregates over the weights of all the
+        :py:class:`yatel.dom.Edge` of a given environment (or all the edges
+        if no environment is given) in a single query.
+
+        **REQUIRE MODE:** r
+
+        Parameters
+        ----------
+        aggregates : iterable
+            Names of the aggregates to compute. Must be a subset of
+            :py:data:`yatel.db.WEIGHTS_AGGREGATES`.
+        env : dict
+            Keys are :py:class:`yatel.dom.Fact` attributes name, and value is
+            a possible value of the given attribute.
+        kwargs : dict
+            Keys are :py:class:`yatel.dom.Fact` attributes name, and value is
+            a possible value of the given attribte.
+
+        Returns
+        -------
+        dict
+            The value of every aggregate. Except ``count``, all the
+            aggregates are ``None`` if there is no edges (``var`` is the
+            population variance).
+
+        Examples
+        --------
+        >>> nw.weights_aggregates(["count", "avg"], place="Hogwarts")
+        {'count': 12, 'avg': 5.6}
+
+        """
+        env = dict(env) if env else {}
+        env.update(kwargs)
+
+        weight = self.edges_table.c.weight
+
+        def filtered(columns):
+            query = sql.select(columns)
+            if env:
+                query = query.where(self._env_edges_where(env))
+            return query
+
+        columns = []
+        for name in aggregates:
+            if name == "count":
+                column = sa.func.count(weight)
+            elif name == "sum":
+                column = sa.func.sum(weight)
+            elif name == "min":
+                column = sa.func.min(weight)
+            elif name == "max":
+                column = sa.func.max(weight)
+            elif name == "avg":
+                column = sa.func.avg(weight)
+            elif name == "var":
+                avg = filtered([sa.func.avg(weight)]).correlate(None)
+                deviation = weight - avg.as_scalar()
+                column = sa.func.avg(deviation * deviation)
+            else:
+                raise ValueError("Invalid aggregate '{}'".format(name))
+            columns.append(column.label(name))
+        row = self.execute(filtered(columns)).fetchone()
+        return dict((k, v) for k, v in row.items())
+
+    def weights_aggregates_by_environment(self, aggregates=WEIGHTS_AGGREGATES,
+                                          facts_attrs=None):
+        """Compute aggregates over the weights of the
+        :py:class:`yatel.dom.Edge` of every environment of the given
+        attributes in a single grouped query (instead of a query by
+        environment).
+
+        **REQUIRE MODE:** r
+
+        Parameters
+        ----------
+        aggregates : iterable
+            Names of the aggregates to compute. Must be a subset of
+            :py:data:`yatel.db.WEIGHTS_AGGREGATES`.
+        facts_attrs : iterable
+            Collection of existing fact attribute names (see:
+            :py:meth:`yatel.db.YatelNetwork.environments`).
+
+        Returns
+        -------
+        iterator
+            Like ``env, dict`` for every environment in the same order of
+            :py:meth:`yatel.db.YatelNetwork.environments`. The dict has the
+            value of every aggregate like
+            :py:meth:`yatel.db.YatelNetwork.weights_aggregates`.
+
+        Examples
+        --------
+        >>> for env, aggs in nw.weights_aggregates_by_environment(
+        ...         ["count", "avg"], ["place"]):
+        ...     print env, aggs
+        <Environment {u'place': u'Hogwarts'} at 0x7f0>  {'count': 12, 'avg': 5.6}
+        <Environment {u'place': u'Mordor'} at 0x7f1>  {'count': 0, 'avg': None}
+
+        """
+        aggregates = tuple(aggregates)
+        for name in aggregates:
+            if name not in WEIGHTS_AGGREGATES:
+                raise ValueError("Invalid aggregate '{}'".format(name))
+        attrs = self._environments_attrs(facts_attrs)
+
+        weight = self.edges_table.c.weight
+        env_columns, select_from = self._env_edges_grouped(attrs)
+        values = {}
+        if select_from is not None:
+            columns = list(env_columns) + [
+                sa.func.count(weight), sa.func.sum(weight),
+                sa.func.min(weight), sa.func.max(weight),
+                sa.func.avg(weight)
+            ]
+            query = sql.select(columns).select_from(select_from).group_by(
+                *env_columns
+            )
+            for row in self._stream(query):
+                row = tuple(row)
+                values[row[:len(attrs)]] = list(row[len(attrs):]) + [None]
+
+        if values and "var" in aggregates:
+            # the variance is the average of the squared deviations from the
+            # average of every environment (the average of the squares minus
+            # the squared average loses all the precision with big weights).
+            # The weights are streamed once and matched with the averages
+            # by environment in a dict.
+            squares = dict.fromkeys(values, 0.0)
+            query = sql.select(list(env_columns) + [weight]).select_from(
+                select_from
+            )
+            for row in self._stream(query):
+                row = tuple(row)
+                key = row[:len(attrs)]
+                deviation = row[len(attrs)] - values[key][4]
+                squares[key] += deviation * deviation
+            for key, square in squares.items():
+                values[key][5] = square / values[key][0]
+
+        for env in self.environments(attrs):
+            key = tuple(env[k] for k in attrs)
+            count, wsum, wmin, wmax, avg, var = values.get(
+                key, (0, None, None, None, None, None)
+            )
+            computed = {"count": count, "sum": wsum, "min": wmin,
+                        "max": wmax, "avg": avg, "var": var}
+            yield env, dict((name, computed[name]) for name in aggregates)
+
+    def _env_edges_grouped(self, attrs):
+        """Creates the join of the edges with the values of ``attrs`` of the
+        environments that contains all their haplotypes.
+
+        Like :py:meth:`yatel.db.YatelNetwork._env_edges_where` only the
+        edges with ``max_nodes`` haplotypes are joined.
+
+        Returns
+        -------
+        tuple
+            Like ``columns, join`` where ``columns`` are the columns of
+            ``attrs`` to group by. ``join`` is ``None`` if there is no
+            edges.
+
+        """
+        facts = self.facts_table
+        env_haps = sql.select(
+            [facts.c[k] for k in attrs] + [facts.c.hap_id]
+        ).distinct()
+
+        max_nodes = self.describe().edge_attributes["max_nodes"]
+        if not max_nodes:
+            return [], None
+
+        if self._edges_layout == EDGES_MEMBERS:
+            members = self.edge_members_table
+            alias = env_haps.alias("env_haps")
+            group = [alias.c[k] for k in attrs] + [members.c.edge_id]
+            env_edges = sql.select(group).select_from(
+                members.join(alias, members.c.hap_id == alias.c.hap_id)
+            ).group_by(*group).having(
+                sa.func.count() == max_nodes
+            ).alias("env_edges")
+            join = self.edges_table.join(
+                env_edges, env_edges.c.edge_id == self.edges_table.c.id
+            )
+            return [env_edges.c[k] for k in attrs], join
+
+        aliases = [
+            env_haps.alias("env_haps_{}".format(cnt))
+            for cnt in range(max_nodes)
+        ]
+        first = aliases[0]
+        join = self.edges_table.join(
+            first, self.edges_table.c.hap_0 == first.c.hap_id
+        )
+        for cnt, alias in enumerate(aliases[1:], 1):
+            conditions = [
+                self.edges_table.c["hap_{}".format(cnt)] == alias.c.hap_id
+            ]
+            conditions.extend(
+                sql.or_(
+                    alias.c[k] == first.c[k],
+                    sql.and_(alias.c[k] == None, first.c[k] == None)
+                ) for k in attrs
+            )
+            join = join.join(alias, sql.and_(*conditions))
+        return [first.c[k] for k in attrs], join
+
     #===========================================================================
     # FACTS QUERIES
     #===========================================================================
@@ -757,7 +1541,7 @@ class YatelNetwork(object):
         
         """
         query = sql.select([self.facts_table])
-        for row in self.execute(query):
+        for row in self._stream(query):
             yield self._row2fact(row)
 
     def facts_by_haplotype(self, hap):
@@ -778,7 +1562,7 @@ class YatelNetwork(object):
         query = sql.select([self.facts_table]).where(
             self.facts_table.c.hap_id == hap.hap_id
         ).distinct()
-        for row in self.execute(query):
+        for row in self._stream(query):
             yield self._row2fact(row)
 
     def facts_by_environment(self, env=None, **kwargs):
@@ -808,7 +1592,7 @@ class YatelNetwork(object):
         where = sql.and_(*[self.facts_table.c[k] == v
                            for k, v in env.items()])
         query = sql.select([self.facts_table]).where(where).distinct()
-        for row in self.execute(query):
+        for row in self._stream(query):
             yield self._row2fact(row)
 
     #===========================================================================
@@ -906,7 +1690,12 @@ class YatelNetwork(object):
             return types
 
         def edge_attributes():
-            max_nodes = len(self.edges_table.c) - 2
+            if self._edges_layout == EDGES_MEMBERS:
+                max_nodes = self.execute(sql.select(
+                    [sa.func.max(self.edge_members_table.c.position) + 1]
+                )).scalar() or 0
+            else:
+                max_nodes = len(self.edges_table.c) - 2
             return {u"weight": float, u"max_nodes": max_nodes}
 
         def sizes():
@@ -946,6 +1735,11 @@ class YatelNetwork(object):
         """Returns uri of the database."""
         return self._uri
 
+    @property
+    def edges_layout(self):
+        """Returns how the edges are stored in the database."""
+        return self._edges_layout
+
 
 #===============================================================================
 # FUNCTIONS
@@ -20,8 +20,12 @@
 #===============================================================================
 
 import sys
+import copy
 import json
+import types
+import hashlib
 import traceback
+import collections
 
 try:
     import cStringIO as StringIO
@@ -32,6 +36,83 @@ from yatel import typeconv
 from yatel.qbj import functions, schema
 
 
+#===============================================================================
+# CONSTANTS
+#===============================================================================
+
+#: Default max number of query results stored by the cache of
+#: :py:class:`yatel.qbj.core.QBJEngine`
+CACHE_SIZE = 128
+
+#: Statistics of the cache of :py:class:`yatel.qbj.core.QBJEngine`
+CacheInfo = collections.namedtuple(
+    "CacheInfo", ["hits", "misses", "maxsize", "currsize"]
+)
+
+
+#===============================================================================
+# FUNCTIONS
+#===============================================================================
+
+def _arguments(function):
+    """All the arguments (positional and named) of a ``function``."""
+    return list(function.get("args", ())) + \
+           list(function.get("kwargs", {}).values())
+
+
+def deterministic(function):
+    """``True`` if all the functions of the ``function`` tree are
+    deterministic.
+
+    """
+    qbjfunc = functions.FUNCTIONS.get(function["name"])
+    if qbjfunc is None or not qbjfunc.deterministic:
+        return False
+    return all(
+        deterministic(arg["function"])
+        for arg in _arguments(function) if "function" in arg
+    )
+
+
+def function_key(function):
+    """The canonical hash of a ``function`` tree or ``None`` if the result
+    of the function can't be reused (is not deterministic or can't be
+    serialized).
+
+    """
+    if not deterministic(function):
+        return None
+    try:
+        canonical = json.dumps(
+            function, sort_keys=True, separators=(",", ":")
+        )
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha1(canonical).hexdigest()
+
+
+def shared_calls(function):
+    """The keys (see: :py:func:`yatel.qbj.core.function_key`) of the calls
+    that appears more than once in the ``function`` tree.
+
+    """
+    counts = collections.Counter()
+
+    def count(func):
+        key = function_key(func)
+        if key is not None:
+            counts[key] += 1
+            if counts[key] > 1:
+                # the calls inside are resolved only once too
+                return
+        for arg in _arguments(func):
+            if "function" in arg:
+                count(arg["function"])
+
+    count(function)
+    return frozenset(key for key, cnt in counts.items() if cnt > 1)
+
+
 #===============================================================================
 # CLASS QBJ RESOLVER
 #===============================================================================
@@ -51,19 +132,33 @@ class QBJResolver(object):
         For further detail on functions arguments see :py:mod:`yatel.qbj.functions`
     context : :py:class:`yatel.db.YatelNetwork`
         Network to execute functions on.
+    shared : frozenset or None
+        Keys of the calls that are used more than once in the query (see:
+        :py:func:`yatel.qbj.core.shared_calls`). Only the resolver of the
+        whole query must use ``None``.
+    memo : dict or None
+        The results of the shared calls already resolved.
+
+    The identical deterministic calls of the query are resolved only once
+    (the iterators they return are readed once and every use of the call
+    receives a new iterator over the readed values).
 
     """
 
-    def __init__ (self, function, context):
+    def __init__ (self, function, context, shared=None, memo=None):
         self.function = function
         self.context = context
+        self.shared = shared_calls(function) if shared is None else shared
+        self.memo = {} if memo is None else memo
 
     def _argument_resolver(self, arg):
         atype = arg["type"]
         value = None
         if "function" in arg:
             function = arg["function"]
-            resolver = QBJResolver(function, self.context)
+            resolver = QBJResolver(
+                function, self.context, self.shared, self.memo
+            )
             value = resolver.resolve()
         else:
             value = arg["value"]
@@ -74,6 +169,20 @@ class QBJResolver(object):
         respective arguments, and return its result.
 
         """
+        key = function_key(self.function) if self.shared else None
+        if key not in self.shared:
+            return self._call()
+        if key not in self.memo:
+            result = self._call()
+            if isinstance(result, types.GeneratorType):
+                self.memo[key] = (True, list(result))
+            else:
+                self.memo[key] = (False, result)
+        is_iterator, result = self.memo[key]
+        return iter(result) if is_iterator else result
+
+    def _call(self):
+        """Resolves the arguments and calls the function."""
         name = self.function["name"]
         args = []
         for arg in self.function.get("args", ()):
@@ -96,15 +205,55 @@ class QBJEngine(object):
     """Responsible of storing context for QBJ queries, and executes the
     functions required on it.
 
+    The results of the queries are stored in a LRU cache keyed by a hash
+    of the ``function`` of the query (the ``id`` is ignored). The queries
+    that call a non deterministic function (like ``now``) are never cached.
+
     Parameters
     ----------
     nw : :py:class:`yatel.db.YatelNetwork`
         Network to be used with the query.
+    cache_size : int
+        Max number of results stored in the cache (``0`` disables the
+        cache).
 
     """
 
-    def __init__(self, nw):
+    def __init__(self, nw, cache_size=CACHE_SIZE):
         self.context = nw
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = collections.OrderedDict()
+
+    def cache_key(self, function):
+        """The canonical hash of a ``function`` of a query or ``None`` if
+        the result of the function can't be cached (see:
+        :py:func:`yatel.qbj.core.function_key`).
+
+        """
+        if not self.cache_size:
+            return None
+        return function_key(function)
+
+    def cache_info(self):
+        """Returns a :py:data:`yatel.qbj.core.CacheInfo` with the hits,
+        misses, max size and current size of the cache.
+
+        """
+        return CacheInfo(
+            hits=self.hits, misses=self.misses,
+            maxsize=self.cache_size, currsize=len(self._cache)
+        )
+
+    def clear_cache(self):
+        """Remove all the results from the cache and reset the counters
+        (must be called if the network is changed by another process).
+
+        """
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
 
     def execute(self, querydict, stacktrace=False):
         """Takes the query in ``querydict`` and executes it after validation of
@@ -132,8 +281,21 @@ class QBJEngine(object):
             schema.validate(querydict)
             query_id = querydict["id"]
             function = querydict["function"]
-            main_resolver = QBJResolver(function, self.context)
-            result = typeconv.simplifier(main_resolver.resolve())
+            key = self.cache_key(function)
+            if key is not None and key in self._cache:
+                self.hits += 1
+                cached = self._cache.pop(key)
+                self._cache[key] = cached
+                result = copy.deepcopy(cached)
+            else:
+                if key is not None:
+                    self.misses += 1
+                main_resolver = QBJResolver(function, self.context)
+                result = typeconv.simplifier(main_resolver.resolve())
+                if key is not None:
+                    if len(self._cache) >= self.cache_size:
+                        self._cache.popitem(last=False)
+                    self._cache[key] = copy.deepcopy(result)
         except Exception as err:
             if not query_id and isinstance(querydict, dict):
                 query_id = querydict.get("id")
@@ -18,6 +18,7 @@ import datetime as dt
 
 from yatel import stats
 from yatel import db
+from yatel.stats import describe as _stats_describe
 from yatel.cluster import kmeans as _kmeans
 
 
@@ -36,7 +37,7 @@ PRIVATE_FUNC_DATA = ["func"]
 
 #: doc
 QBJFunction = collections.namedtuple(
-    "QBJFunction", ["name", "doc", "func"]
+    "QBJFunction", ["name", "doc", "func", "deterministic"]
 )
 
 
@@ -44,13 +45,29 @@ QBJFunction = collections.namedtuple(
 # REGISTER FUNCTION
 #===============================================================================
 
-def qbjfunction(name=None, doc=None):
+def qbjfunction(name=None, doc=None, deterministic=True):
+    """Register a function to be called from QBJ.
+
+    Parameters
+    ----------
+    name : str or None
+        Name of the function in QBJ (the name of the python function by
+        default).
+    doc : str or None
+        Documentation of the function (the docstring by default).
+    deterministic : bool
+        ``False`` if the function can return different results with the same
+        arguments over the same network (the results of the queries that use
+        it are never cached by :py:class:`yatel.qbj.core.QBJEngine`).
+
+    """
 
     def _dec(func):
         qbjfunc = QBJFunction(
             name=name or func.__name__,
             doc=doc or func.__doc__,
-            func=func
+            func=func,
+            deterministic=deterministic
         )
         FUNCTIONS[qbjfunc.name] = qbjfunc
         if doc is not None:
@@ -150,8 +167,20 @@ def describe(nw):
 
 
 @qbjfunction(doc=db.YatelNetwork.environments.__doc__)
-def environments(nw, facts_attrs=None):
-    return nw.environments(facts_attrs=facts_attrs)
+def environments(nw, facts_attrs=None, with_counts=False, order_by=None,
+                 limit=None, offset=None):
+    return nw.environments(
+        facts_attrs=facts_attrs, with_counts=with_counts, order_by=order_by,
+        limit=limit, offset=offset
+    )
+
+
+@qbjfunction(doc=db.YatelNetwork.weights_aggregates_by_environment.__doc__)
+def weights_aggregates_by_environment(nw, aggregates=db.WEIGHTS_AGGREGATES,
+                                      facts_attrs=None):
+    return nw.weights_aggregates_by_environment(
+        aggregates=aggregates, facts_attrs=facts_attrs
+    )
 
 
 #==============================================================================
@@ -223,6 +252,16 @@ def sum(nw, env=None, **kwargs):
     return stats.sum(nw, env=env, **kwargs)
 
 
+@qbjfunction(doc=stats.skew.__doc__)
+def skew(nw, env=None, **kwargs):
+    return stats.skew(nw, env=env, **kwargs)
+
+
+@qbjfunction(name="stats_describe", doc=stats.describe.__doc__)
+def stats_describe(nw, env=None, stats=None, q=(25, 50, 75), **kwargs):
+    return _stats_describe(nw, env=env, stats=stats, q=q, **kwargs)
+
+
 @qbjfunction(doc=stats.var.__doc__)
 def var(nw, env=None, **kwargs):
     return stats.var(nw, env=env, **kwargs)
@@ -237,7 +276,7 @@ def variation(nw, env=None, **kwargs):
 # DM
 #==============================================================================
 
-@qbjfunction(doc=_kmeans.kmeans)
+@qbjfunction(deterministic=False)
 def kmeans(nw, envs, k_or_guess, whiten=False, coords=None, *args, **kwargs):
     """Performs k-means on a set of all environments defined by ``fact_attrs``
     of a network.
@@ -298,6 +337,53 @@ def kmeans(nw, envs, k_or_guess, whiten=False, coords=None, *args, **kwargs):
     )
 
 
+@qbjfunction(deterministic=False)
+def minibatch_kmeans(nw, envs, k_or_guess, batch_size=_kmeans.BATCH_SIZE,
+                     max_iter=_kmeans.MAX_ITER, seed=None, whiten=False,
+                     coords=None):
+    """Performs a mini-batch k-means on a set of environments of a network
+    over a sparse observation matrix.
+
+    Parameters
+    ----------
+    nw : :py:class:`yatel.db.YatelNetwork`
+        Network source of environments to classify.
+    envs : iterable of :py:class:`yatel.dom.Environments` or dicts
+        Represents all the environments to be clustered.
+    k_or_guess : int or ndarray
+        The number of centroids to generate or a k by N array with the
+        initial centroids.
+    batch_size : int
+        Number of observations used on every iteration.
+    max_iter : int
+        Max number of iterations.
+    seed : None or int
+        Seed of the random numbers generator.
+    whiten : bool
+        Scale every dimension of the observations by their standard
+        deviation.
+    coords : None or dict
+        If is not ``None`` a dict with the coordinates of every
+        environment.
+
+    Returns
+    -------
+    coodebook : an array kxn of k centroids
+    distortion : the value of the distortion
+    labels : the code of the closest centroid of every environment
+
+    """
+    def dcoords(nw, env):
+        return coords[env]
+
+    coordc = dcoords if coords else None
+
+    return _kmeans.minibatch_kmeans(
+        nw=nw, envs=envs, k_or_guess=k_or_guess, batch_size=batch_size,
+        max_iter=max_iter, seed=seed, whiten=whiten, coordc=coordc
+    )
+
+
 #===============================================================================
 # GENERIC ITERATION
 #===============================================================================
@@ -391,37 +477,37 @@ def index(nw, iterable, value, start=None, end=None):
 # DATE AND TIME
 #==============================================================================
 
-@qbjfunction()
+@qbjfunction(deterministic=False)
 def now(nw, *args, **kwargs):
     """Return the current local date and time."""
     return dt.datetime.now()
 
 
-@qbjfunction()
+@qbjfunction(deterministic=False)
 def utcnow(nw, *args, **kwargs):
     """Return the current UTC date and time."""
     return dt.datetime.utcnow()
 
 
-@qbjfunction()
+@qbjfunction(deterministic=False)
 def today(nw, *args, **kwargs):
     """Return the current local date."""
     return dt.date.today()
 
 
-@qbjfunction()
+@qbjfunction(deterministic=False)
 def utctoday(nw, *args, **kwargs):
     """Return ``date`` object of current UTC date and time."""
     return dt.datetime.utcnow().date()
 
 
-@qbjfunction()
+@qbjfunction(deterministic=False)
 def time(nw, *args, **kwargs):
     """Return ``time`` object of current local date and time.."""
     return dt.datetime.now().time()
 
 
-@qbjfunction()
+@qbjfunction(deterministic=False)
 def utctime(nw, *args, **kwargs):
     """Return ``time`` object of current UTC date and time."""
     return dt.datetime.utcnow().time()
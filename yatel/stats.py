@@ -43,6 +43,8 @@ def average(nw, env=None, **kwargs):
         Environment for filtering.
 
     """
+    if isinstance(nw, db.YatelNetwork):
+        return _aggregates(nw, ["avg"], env, kwargs)["avg"]
     arr = env2weightarray(nw, env=env, **kwargs)
     return np.average(arr)
 
@@ -88,6 +90,8 @@ def min(nw, env=None, **kwargs):
         Environment for filtering.
 
     """
+    if isinstance(nw, db.YatelNetwork):
+        return _aggregates(nw, ["min"], env, kwargs, empty=False)["min"]
     arr = env2weightarray(nw, env=env, **kwargs)
     return np.min(arr)
 
@@ -103,6 +107,8 @@ def max(nw, env=None, **kwargs):
         Environment for filtering.
 
     """
+    if isinstance(nw, db.YatelNetwork):
+        return _aggregates(nw, ["max"], env, kwargs, empty=False)["max"]
     arr = env2weightarray(nw, env=env, **kwargs)
     return np.max(arr)
 
@@ -118,6 +124,8 @@ def amin(nw, env=None, **kwargs):
         Environment for filtering.
 
     """
+    if isinstance(nw, db.YatelNetwork):
+        return _aggregates(nw, ["min"], env, kwargs, empty=False)["min"]
     arr = env2weightarray(nw, env=env, **kwargs)
     return np.amin(arr)
 
@@ -133,6 +141,8 @@ def amax(nw, env=None, **kwargs):
         Environment for filtering.
 
     """
+    if isinstance(nw, db.YatelNetwork):
+        return _aggregates(nw, ["max"], env, kwargs, empty=False)["max"]
     arr = env2weightarray(nw, env=env, **kwargs)
     return np.amax(arr)
 
@@ -148,6 +158,9 @@ def sum(nw, env=None, **kwargs):
         Environment for filtering.
 
     """
+    if isinstance(nw, db.YatelNetwork):
+        rs = _aggregates(nw, ["count", "sum"], env, kwargs)
+        return rs["sum"] if rs["count"] else np.float64(0)
     arr = env2weightarray(nw, env=env, **kwargs)
     return np.sum(arr)
 
@@ -185,6 +198,8 @@ def var(nw, env=None, **kwargs):
         Environment for filtering.
 
     """
+    if isinstance(nw, db.YatelNetwork):
+        return _aggregates(nw, ["var"], env, kwargs)["var"]
     arr = env2weightarray(nw, env=env, **kwargs)
     return np.var(arr)
 
@@ -200,6 +215,8 @@ def std(nw, env=None, **kwargs):
         Environment for filtering.
 
     """
+    if isinstance(nw, db.YatelNetwork):
+        return np.sqrt(_aggregates(nw, ["var"], env, kwargs)["var"])
     arr = env2weightarray(nw, env=env, **kwargs)
     return np.std(arr)
 
@@ -229,6 +246,9 @@ def range(nw, env=None, **kwargs):
         Environment for filtering.
 
     """
+    if isinstance(nw, db.YatelNetwork):
+        rs = _aggregates(nw, ["min", "max"], env, kwargs, empty=False)
+        return rs["max"] - rs["min"]
     arr = env2weightarray(nw, env=env, **kwargs)
     return np.amax(arr) - np.amin(arr)
 
@@ -252,10 +272,110 @@ def kurtosis(nw, env=None, **kwargs):
     return stats.kurtosis(arr)
 
 
+def skew(nw, env=None, **kwargs):
+    """Computes the skewness of a network.
+
+    Parameters
+    ----------
+    nw : :py:class:`yatel.db.YatelNetwork`
+        Network to which apply the operation.
+    env : :py:class:`yatel.dom.Enviroment` or dict like
+        Environment for filtering.
+
+    """
+    arr = env2weightarray(nw, env=env, **kwargs)
+    return stats.skew(arr)
+
+
+#===============================================================================
+# SUMMARY
+#===============================================================================
+
+#: The statistics that :py:func:`yatel.stats.describe` can compute
+DESCRIBE_STATS = collections.OrderedDict([
+    ("average", average), ("median", median), ("percentile", percentile),
+    ("min", min), ("max", max), ("amin", amin), ("amax", amax),
+    ("sum", sum), ("mode", mode), ("var", var), ("std", std),
+    ("variation", variation), ("range", range), ("kurtosis", kurtosis),
+    ("skew", skew)
+])
+
+
+def describe(nw, env=None, stats=None, q=(25, 50, 75), **kwargs):
+    """Compute several statistics of a network reading the weights only
+    once.
+
+    Parameters
+    ----------
+    nw : :py:class:`yatel.db.YatelNetwork`
+        Network to which apply the operation.
+    env : :py:class:`yatel.dom.Enviroment` or dict like
+        Environment for filtering.
+    stats : iterable
+        Names of the statistics to compute (keys of
+        :py:data:`yatel.stats.DESCRIBE_STATS`). By default all the
+        statistics are computed.
+    q : float or iterable
+        The percentiles to compute if ``percentile`` is requested.
+
+    Returns
+    -------
+    dict
+        The value of every requested statistic. Statistics that are
+        undefined for an empty environment (like ``min``) are ``nan``.
+
+    Examples
+    --------
+    >>> stats.describe(nw, {"place": "Hogwarts"}, ["average", "std"])
+    {'average': 5.6, 'std': 1.2}
+
+    """
+    names = DESCRIBE_STATS.keys() if stats is None else stats
+    for name in names:
+        if name not in DESCRIBE_STATS:
+            raise ValueError("Invalid statistic '{}'".format(name))
+
+    arr = env2weightarray(nw, env=env, **kwargs)
+    result = {}
+    for name in names:
+        func = DESCRIBE_STATS[name]
+        try:
+            if name == "percentile":
+                result[name] = func(arr, q)
+            else:
+                result[name] = func(arr)
+        except (ValueError, IndexError):
+            if len(arr):
+                raise
+            result[name] = np.nan
+    return result
+
+
 #===============================================================================
 # SUPPORT
 #===============================================================================
 
+def _aggregates(nw, aggregates, env, kwargs, empty=True):
+    """Compute the ``aggregates`` of the weights of the environment in the
+    database of ``nw`` (see
+    :py:meth:`yatel.db.YatelNetwork.weights_aggregates`) and returns them
+    as **numpy.float64**, using ``nan`` for the undefined values.
+
+    If ``empty`` is ``False`` a ``ValueError`` is raised when there is
+    no edges in the environment (like the numpy reductions without
+    identity).
+
+    """
+    rs = nw.weights_aggregates(aggregates, env, **kwargs)
+    if not empty and None in rs.values():
+        raise ValueError("zero-size environment has no {}".format(
+            ", ".join(aggregates)
+        ))
+    return dict(
+        (k, np.nan if v is None else np.float64(v)) for k, v in rs.items()
+    )
+
+
 def weights2array(edges):
     """Create a **numpy.ndarray** with all the weights of 
     :py:class:`yatel.dom.Edge`
@@ -276,6 +396,10 @@ def env2weightarray(nw, env=None, **kwargs):
     - In the last case the function tries to convert ``nw`` to 
       **numpy.ndarray** instance.
 
+    The arrays of a :py:class:`yatel.db.YatelNetwork` are the cached (and
+    read-only) arrays of :py:meth:`yatel.db.YatelNetwork.weights_array`;
+    copy them before change them.
+
     """
     env = dict(env) if env else {}
     env.update(kwargs)
@@ -285,9 +409,7 @@ def env2weightarray(nw, env=None, **kwargs):
             raise ValueError(msg)
         return nw
     elif isinstance(nw, db.YatelNetwork):
-        if not env:
-            return weights2array(nw.edges())
-        return  weights2array(nw.edges_by_environment(env=env))
+        return nw.weights_array(env)
     else:
         return np.array(nw)
 
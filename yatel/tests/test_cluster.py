@@ -17,12 +17,31 @@
 # IMPORTS
 #===============================================================================
 
-import random, unittest
+import os, random, tempfile, unittest, multiprocessing
+
+import numpy as np
+import scipy.sparse
 
 from yatel.cluster import kmeans
 from yatel.tests import core
 
 
+#===============================================================================
+# COORDC
+#===============================================================================
+
+def env_coords(nw, env):
+    haps = list(nw.haplotypes_by_environment(env))
+    facts = list(nw.facts_by_environment(env))
+    return [len(haps), len(facts)]
+
+
+class SerialExecutor(object):
+
+    def map(self, func, iterable):
+        return map(func, iterable)
+
+
 #===============================================================================
 # VALIDATE TESTS
 #===============================================================================
@@ -69,6 +88,145 @@ class TestKmeans(core.YatelTestCase):
             coords1 = kmeans.hap_in_env_coords(self.nw, envs[idx])
             self.assertTrue((coords0==coords1).all())
 
+    def test_hap_in_envs_matrix(self):
+        envs = list(self.nw.environments())
+        envs.extend(self.nw.environments(["native"]))
+        envs.append({})
+        coords = np.array(
+            [kmeans.hap_in_env_coords(self.nw, env) for env in envs]
+        )
+        dense = kmeans.hap_in_envs_matrix(self.nw, envs)
+        self.assertTrue((dense == coords).all())
+        sparse = kmeans.hap_in_envs_matrix(self.nw, iter(envs), sparse=True)
+        self.assertTrue((sparse.toarray() == coords).all())
+        self.assertEqual(kmeans.hap_in_envs_matrix(self.nw, []).shape[0], 0)
+
+    def test_nw2obs_sparse(self):
+        envs = list(self.nw.environments())
+        for coordc in [None, kmeans.hap_in_env_coords]:
+            for whiten in [True, False]:
+                dense = kmeans.nw2obs(
+                    self.nw, envs, whiten=whiten, coordc=coordc
+                )
+                sparse = kmeans.nw2obs(
+                    self.nw, envs, whiten=whiten, coordc=coordc, sparse=True
+                )
+                self.assertTrue(np.allclose(dense, sparse.toarray()))
+
+    def test_parallel_coords(self):
+        envs = list(self.nw.environments())
+        with self.assertRaises(ValueError):
+            kmeans.nw2obs(self.nw, envs, coordc=env_coords, n_jobs=2)
+
+        fd, ftemp = tempfile.mkstemp()
+        try:
+            nw = self.get_random_nw({"engine": "sqlite", "database": ftemp})[0]
+            envs = list(nw.environments())
+            orig = kmeans.nw2obs(nw, envs, coordc=env_coords)
+            rs = kmeans.nw2obs(nw, envs, coordc=env_coords, n_jobs=2)
+            self.assertTrue((orig == rs).all())
+            rs = kmeans.nw2obs(
+                nw, envs, coordc=env_coords, executor=SerialExecutor()
+            )
+            self.assertTrue((orig == rs).all())
+            # nothing is opened in this process for the next runs
+            self.assertIsNone(kmeans._coords_worker)
+
+            tasks = []
+
+            class RecordExecutor(SerialExecutor):
+                def map(self, func, iterable):
+                    iterable = list(iterable)
+                    tasks.extend(iterable)
+                    return map(func, iterable)
+
+            chunk_size, kmeans.EXECUTOR_CHUNK_SIZE = \
+                kmeans.EXECUTOR_CHUNK_SIZE, 2
+            try:
+                rs = kmeans.nw2obs(
+                    nw, envs, coordc=env_coords, executor=RecordExecutor()
+                )
+            finally:
+                kmeans.EXECUTOR_CHUNK_SIZE = chunk_size
+            self.assertTrue((orig == rs).all())
+            self.assertEqual(len(tasks), (len(envs) + 1) // 2)
+
+            if core.MOCK:
+                kmeans.kmeans(
+                    nw, envs, 2, coordc=env_coords,
+                    executor=SerialExecutor(), iter=5
+                )
+                _, kwargs = kmeans.vq.kmeans.call_args
+                self.assertEqual(
+                    sorted(kwargs), ["iter", "k_or_guess", "obs"]
+                )
+                self.assertTrue((kwargs["obs"] == orig).all())
+            pool = multiprocessing.Pool(2)
+            try:
+                rs = kmeans.nw2obs(
+                    nw, envs, coordc=env_coords, executor=pool, sparse=True
+                )
+            finally:
+                pool.terminate()
+                pool.join()
+            self.assertTrue((orig == rs.toarray()).all())
+            rs = kmeans.minibatch_kmeans(
+                nw, envs, 1, coordc=env_coords, n_jobs=2
+            )
+            self.assertEqual(rs[0].shape, (1, 2))
+            self.assertEqual(list(rs[2]), [0] * len(envs))
+        finally:
+            os.close(fd)
+            os.remove(ftemp)
+
+    def test_minibatch_vq(self):
+        rand = np.random.RandomState(0)
+        centers = np.array([[0., 0., 0.], [10., 10., 10.], [0., 20., 0.]])
+        obs = np.vstack([c + rand.rand(50, 3) for c in centers])
+        for data in [obs, scipy.sparse.csr_matrix(obs)]:
+            codebook, distortion, labels = kmeans.minibatch_vq(
+                data, 3, batch_size=20, seed=42
+            )
+            self.assertEqual(codebook.shape, (3, 3))
+            self.assertEqual(len(set(labels[:50])), 1)
+            self.assertEqual(len(set(labels[50:100])), 1)
+            self.assertEqual(len(set(labels[100:])), 1)
+            self.assertEqual(len(set(labels)), 3)
+            for code in range(3):
+                self.assertTrue(np.allclose(
+                    codebook[code], obs[labels == code].mean(axis=0), atol=0.2
+                ))
+            dists = np.sqrt(((obs - codebook[labels]) ** 2).sum(axis=1))
+            self.assertAlmostEqual(distortion, dists.mean())
+        rs0 = kmeans.minibatch_vq(obs, 3, batch_size=10, seed=1)
+        rs1 = kmeans.minibatch_vq(
+            scipy.sparse.csr_matrix(obs), 3, batch_size=10, seed=1
+        )
+        self.assertTrue(np.allclose(rs0[0], rs1[0]))
+        self.assertTrue((rs0[2] == rs1[2]).all())
+        rs = kmeans.minibatch_vq(obs, centers, max_iter=0)
+        self.assertTrue((rs[2] == np.repeat([0, 1, 2], 50)).all())
+        with self.assertRaises(ValueError):
+            kmeans.minibatch_vq(obs, 200)
+        with self.assertRaises(ValueError):
+            kmeans.minibatch_vq(np.empty((0, 3)), 1)
+
+    def test_minibatch_kmeans(self):
+        envs = list(self.nw.environments())
+        codebook, distortion, labels = kmeans.minibatch_kmeans(
+            self.nw, envs, 2, batch_size=3, seed=7
+        )
+        obs = kmeans.nw2obs(self.nw, envs)
+        self.assertEqual(codebook.shape, (2, obs.shape[1]))
+        self.assertEqual(len(labels), len(envs))
+        dists = ((obs[:, None, :] - codebook[None, :, :]) ** 2).sum(axis=2)
+        self.assertTrue((labels == dists.argmin(axis=1)).all())
+        rs = kmeans.minibatch_kmeans(
+            self.nw, envs, 2, batch_size=3, seed=7, sparse=False
+        )
+        self.assertTrue(np.allclose(rs[0], codebook))
+        self.assertAlmostEqual(rs[1], distortion)
+
 
 #===============================================================================
 # MAIN
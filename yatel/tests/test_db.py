@@ -22,6 +22,10 @@ import random
 import string
 import tempfile
 
+import numpy as np
+
+import sqlalchemy as sa
+
 from yatel import db, dom
 
 from yatel.tests.core import YatelTestCase
@@ -216,6 +220,62 @@ class YatelNetwork(YatelTestCase):
         self.assertSameUnsortedContent(nw.edges(), self.nw.edges())
         self.assertSameUnsortedContent(nw.environments(), self.nw.environments())
 
+    def test_chunk_size(self):
+        haplotypes = self.haplotypes + [dom.Haplotype(3, color="red")]
+        edges = self.edges + [dom.Edge(1, (3, 0, 1))]
+        facts = self.facts + [dom.Fact(3, native=True)]
+        for chunk_size in [1, 2, 3]:
+            nw = db.YatelNetwork("memory", mode="w", chunk_size=chunk_size)
+            nw.add_elements(haplotypes + edges + facts)
+            nw.confirm_changes()
+            self.assertSameUnsortedContent(nw.haplotypes(), haplotypes)
+            self.assertSameUnsortedContent(nw.facts(), facts)
+            self.assertSameUnsortedContent(nw.edges(), edges)
+            desc = nw.describe()
+            self.assertEquals(desc["edge_attributes"]["max_nodes"], 3)
+            self.assertIn("color", desc["haplotype_attributes"])
+            self.assertIn("native", desc["fact_attributes"])
+
+    def test_indexes(self):
+        structural = set([
+            "ix_haplotypes_hap_id", "ix_facts_hap_id",
+            "ix_edges_hap_0", "ix_edges_hap_1"
+        ])
+        policies = [
+            (db.INDEX_ALL, set(["name", "clima", "age", "population"]),
+             set(["name", "lang", "timezone"])),
+            (db.INDEX_NONE, set(), set()),
+            (["name", "lang"], set(["name"]), set(["name", "lang"]))
+        ]
+        for defer_indexes in [True, False]:
+            for indexes, hap_attrs, fact_attrs in policies:
+                try:
+                    fd, ftemp = tempfile.mkstemp()
+                    conn = {"engine": "sqlite", "database": ftemp}
+                    nw = db.YatelNetwork(
+                        mode="w", indexes=indexes,
+                        defer_indexes=defer_indexes, **conn
+                    )
+                    nw.add_elements(self.haplotypes + self.edges + self.facts)
+                    nw.confirm_changes()
+
+                    self.assertSameUnsortedContent(
+                        nw.haplotypes(), self.haplotypes
+                    )
+                    nw = db.YatelNetwork(**conn)
+                    orig = set(structural)
+                    orig.update("ix_haplotypes_" + a for a in hap_attrs)
+                    orig.update("ix_facts_" + a for a in fact_attrs)
+                    rs = set()
+                    for tname in db.TABLES:
+                        table = getattr(nw, tname + "_table")
+                        rs.update(idx.name for idx in table.indexes)
+                    self.assertEquals(orig, rs)
+                except:
+                    raise
+                finally:
+                    os.close(fd)
+
     def test_edges(self):
         self.assertSameUnsortedContent(self.nw.edges(), self.edges)
 
@@ -262,6 +322,19 @@ class YatelNetwork(YatelTestCase):
         self.assertEqual(rs[0], self.haplotypes[0])
         self.assertEqual(rs[1], self.haplotypes[2])
 
+    def test_haplotypes_ids_by_environments(self):
+        envs = [{}, {"name": "Andalucia"}, {"name": "Nowhere"}]
+        envs.extend(self.nw.environments())
+        envs.extend(self.nw.environments(["name"]))
+        rs = self.nw.haplotypes_ids_by_environments(iter(envs))
+        self.assertEqual(len(rs), len(envs))
+        for env, haps_ids in zip(envs, rs):
+            orig = frozenset(
+                hap.hap_id for hap in self.nw.haplotypes_by_environment(env)
+            )
+            self.assertEqual(haps_ids, orig)
+        self.assertEqual(self.nw.haplotypes_ids_by_environments([]), [])
+
     def test_environments(self):
         desc = self.nw.describe()
         fact_attrs = desc["fact_attributes"].keys()
@@ -273,11 +346,238 @@ class YatelNetwork(YatelTestCase):
                     filters.add(f)
             list(self.nw.environments(list(filters)))
 
+    def test_environments_counts(self):
+        nw = self.get_random_nw(self.conn())[0]
+        for facts_attrs in [["place"], ["place", "native"], None]:
+            envs = list(nw.environments(facts_attrs))
+            rs = list(nw.environments(facts_attrs, with_counts=True))
+            self.assertSameUnsortedContent([env for env, _ in rs], envs)
+            for env, counts in rs:
+                haps = list(nw.haplotypes_by_environment(env))
+                facts = list(nw.facts_by_environment(env))
+                self.assertEqual(counts["haplotypes"], len(haps))
+                self.assertEqual(counts["facts"], len(facts))
+
+            by_count = list(nw.environments(
+                facts_attrs, with_counts=True, order_by="count"
+            ))
+            haps_counts = [counts["haplotypes"] for _, counts in by_count]
+            self.assertEqual(haps_counts, sorted(haps_counts, reverse=True))
+            by_facts = list(nw.environments(
+                facts_attrs, with_counts=True, order_by="facts"
+            ))
+            facts_counts = [counts["facts"] for _, counts in by_facts]
+            self.assertEqual(facts_counts, sorted(facts_counts, reverse=True))
+
+            ordered = list(nw.environments(facts_attrs, order_by="count"))
+            self.assertEqual(ordered, [env for env, _ in by_count])
+            pages = []
+            for offset in range(0, len(envs), 3):
+                pages.extend(nw.environments(
+                    facts_attrs, limit=3, offset=offset
+                ))
+            self.assertEqual(len(pages), len(envs))
+            self.assertSameUnsortedContent(pages, envs)
+            page = list(nw.environments(
+                facts_attrs, with_counts=True, order_by="count",
+                limit=2, offset=1
+            ))
+            self.assertEqual(page, by_count[1:3])
+
+        self.assertEqual(
+            [env["place"] for env in nw.environments(
+                ["place"], order_by="place"
+            )],
+            sorted(env["place"] for env in nw.environments(["place"]))
+        )
+        with self.assertRaises(ValueError):
+            list(nw.environments(["place"], order_by="foo"))
+
     def test_edges_by_haplotype(self):
         for hap in self.haplotypes:
             for edge in self.nw.edges_by_haplotype(hap):
                 self.assertIn(hap.hap_id, edge.haps_id)
 
+    def test_weights_array(self):
+        arr = self.nw.weights_array()
+        self.assertEquals(arr.dtype, float)
+        self.assertEquals(sorted(arr), sorted(e.weight for e in self.edges))
+        for env in self.nw.environments():
+            self.assertEquals(
+                sorted(self.nw.weights_array(env)),
+                sorted(e.weight for e in self.nw.edges_by_environment(env))
+            )
+        self.assertEquals(len(self.nw.weights_array(name="Nothing")), 0)
+
+    def test_weights_cache(self):
+        arr = self.nw.weights_array(lang="sp", name="Andalucia")
+        self.assertIs(
+            self.nw.weights_array({"name": "Andalucia", "lang": "sp"}), arr
+        )
+        self.assertFalse(arr.flags.writeable)
+
+        fd, ftemp = tempfile.mkstemp()
+        try:
+            conn = {"engine": "sqlite", "database": ftemp}
+            wnw = db.YatelNetwork(mode="w", **conn)
+            db.copy(self.nw, wnw)
+            wnw.confirm_changes()
+            nw = db.YatelNetwork(mode="r", **conn)
+            arr = nw.weights_array()
+            self.assertIs(nw.weights_array(), arr)
+
+            anw = db.YatelNetwork(mode="a", **conn)
+            anw.add_element(dom.Edge(1, (0, 1)))
+            anw.confirm_changes()
+            self.assertEquals(len(nw.weights_array()), len(arr) + 1)
+            self.assertEquals(len(anw.weights_array()), len(arr) + 1)
+
+            # the weights readed before the confirmation are not kept
+            # and the network stays registered for the next appends
+            for cnt in (2, 3):
+                anw = db.YatelNetwork(mode="a", **conn)
+                self.assertEquals(len(nw.weights_array()), len(arr) + cnt - 1)
+                anw.add_element(dom.Edge(1, (0, 1)))
+                anw.confirm_changes()
+                self.assertEquals(len(nw.weights_array()), len(arr) + cnt)
+        finally:
+            os.close(fd)
+
+    def test_weights_cache_lru(self):
+        cache = db.WeightsCache(max_bytes=3 * 8)
+        cache.put({"a": 1}, np.zeros(2))
+        cache.put({"a": 2}, np.zeros(1))
+        self.assertEquals(cache.nbytes, 3 * 8)
+        cache.get({"a": 1})
+        cache.put({"a": 3}, np.zeros(1))
+        self.assertIn({"a": 1}, cache)
+        self.assertNotIn({"a": 2}, cache)
+        self.assertIn({"a": 3}, cache)
+        cache.put({"a": 4}, np.zeros(4))
+        self.assertNotIn({"a": 4}, cache)
+        self.assertEquals(len(cache), 2)
+        cache.clear()
+        self.assertEquals((len(cache), cache.nbytes), (0, 0))
+
+        nw = db.YatelNetwork("memory", mode="w", weights_cache_size=0)
+        db.copy(self.nw, nw)
+        nw.confirm_changes()
+        self.assertIsNot(nw.weights_array(), nw.weights_array())
+
+    def test_weights_aggregates(self):
+        envs = [{}] + list(self.nw.environments())
+        for env in envs:
+            arr = self.nw.weights_array(env)
+            rs = self.nw.weights_aggregates(db.WEIGHTS_AGGREGATES, env)
+            self.assertEquals(rs["count"], len(arr))
+            if len(arr):
+                self.assertAlmostEqual(rs["sum"], np.sum(arr))
+                self.assertAlmostEqual(rs["min"], np.min(arr))
+                self.assertAlmostEqual(rs["max"], np.max(arr))
+                self.assertAlmostEqual(rs["avg"], np.average(arr))
+                self.assertAlmostEqual(rs["var"], np.var(arr))
+            else:
+                for k in ("sum", "min", "max", "avg", "var"):
+                    self.assertIsNone(rs[k])
+        with self.assertRaises(ValueError):
+            self.nw.weights_aggregates(["median"])
+
+    def test_weights_aggregates_by_environment(self):
+        nw = self.get_random_nw(self.conn())[0]
+        for facts_attrs in [None, ["lang"], ["name", "lang"],
+                            ["place"], ["place", "native"]]:
+            if facts_attrs and facts_attrs[0] == "place":
+                net = nw
+            else:
+                net = self.nw
+            envs = list(net.environments(facts_attrs))
+            rs = list(net.weights_aggregates_by_environment(
+                facts_attrs=facts_attrs
+            ))
+            self.assertEqual([env for env, _ in rs], envs)
+            for env, aggs in rs:
+                orig = net.weights_aggregates(db.WEIGHTS_AGGREGATES, env)
+                self.assertEqual(sorted(aggs), sorted(orig))
+                self.assertEqual(aggs["count"], orig["count"])
+                for name in ("sum", "min", "max", "avg", "var"):
+                    if orig[name] is None:
+                        self.assertIsNone(aggs[name])
+                    else:
+                        self.assertAlmostEqual(aggs[name], orig[name])
+        rs = list(self.nw.weights_aggregates_by_environment(
+            ["count", "max"], ["name"]
+        ))
+        self.assertEqual(
+            dict((env["name"], aggs) for env, aggs in rs),
+            {"Andalucia": {"count": 1, "max": 9871},
+             None: {"count": 0, "max": None}}
+        )
+        with self.assertRaises(ValueError):
+            list(self.nw.weights_aggregates_by_environment(["median"]))
+
+    def test_weights_aggregates_by_environment_var(self):
+        # big weights with a small variance
+        nw = db.YatelNetwork("memory", mode="w")
+        nw.add_elements([
+            dom.Haplotype(1), dom.Haplotype(2), dom.Haplotype(3),
+            dom.Fact(1, place="a"), dom.Fact(2, place="a"),
+            dom.Fact(3, place="b"),
+            dom.Edge(1e9 + 0.1, (1, 2)), dom.Edge(1e9 + 0.2, (1, 2)),
+            dom.Edge(1e9 + 0.3, (1, 2)), dom.Edge(5., (1, 3))
+        ])
+        nw.confirm_changes()
+        rs = dict(
+            (env["place"], aggs["var"])
+            for env, aggs in nw.weights_aggregates_by_environment(
+                ["var"], ["place"]
+            )
+        )
+        self.assertAlmostEqual(rs["a"], 0.02 / 3, places=5)
+        self.assertIsNone(rs["b"])
+
+    def test_weights_aggregates_by_environment_queries(self):
+        # the number of queries does not grow with the environments, the
+        # weights are read again only for the variance and are never joined
+        # back with the averages of the environments
+        def count_queries(n_envs, aggregates):
+            nw = db.YatelNetwork("memory", mode="w")
+            elems = []
+            for idx in range(n_envs * 2):
+                elems.append(dom.Haplotype(idx))
+                elems.append(dom.Fact(idx, place=idx // 2))
+            for idx in range(0, n_envs * 2, 2):
+                elems.append(dom.Edge(idx, (idx, idx + 1)))
+            nw.add_elements(elems)
+            nw.confirm_changes()
+
+            statements = []
+
+            def before_execute(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            sa.event.listen(nw._engine, "before_cursor_execute",
+                            before_execute)
+            try:
+                rs = list(nw.weights_aggregates_by_environment(
+                    aggregates, ["place"]
+                ))
+            finally:
+                sa.event.remove(nw._engine, "before_cursor_execute",
+                                before_execute)
+            self.assertEquals(len(rs), n_envs)
+            for statement in statements:
+                self.assertLessEqual(statement.upper().count("AVG("), 1)
+            return len(statements)
+
+        for aggregates in (["count", "avg"], ["count", "var"]):
+            self.assertEquals(
+                count_queries(2, aggregates), count_queries(50, aggregates)
+            )
+        self.assertEquals(
+            count_queries(5, ["count", "avg"]) + 1,
+            count_queries(5, ["count", "var"])
+        )
+
     def test_facts_by_haplotype(self):
         for hap in self.haplotypes:
             for fact in self.nw.facts_by_haplotype(hap):
@@ -441,6 +741,137 @@ class YatelNetwork(YatelTestCase):
         finally:
             os.close(fd)
 
+    def test_fetch_size(self):
+        fd, ftemp = tempfile.mkstemp()
+        try:
+            conn = {"engine": "sqlite", "database": ftemp}
+            wnw = db.YatelNetwork(mode="w", **conn)
+            db.copy(self.nw, wnw)
+            wnw.confirm_changes()
+            nw = db.YatelNetwork(mode="r", fetch_size=2, **conn)
+            self.assertSameUnsortedContent(
+                nw.haplotypes(), self.nw.haplotypes()
+            )
+            self.assertSameUnsortedContent(nw.facts(), self.nw.facts())
+            self.assertSameUnsortedContent(nw.edges(), self.nw.edges())
+            self.assertSameUnsortedContent(
+                nw.environments(), self.nw.environments()
+            )
+            # nested iterators don't share the cursor
+            for hap in nw.haplotypes():
+                self.assertSameUnsortedContent(
+                    nw.facts_by_haplotype(hap),
+                    self.nw.facts_by_haplotype(hap)
+                )
+        finally:
+            os.close(fd)
+
+    def test_chunks_foreign_keys(self):
+        def foreign_keys(dbapi_conn, conn_record):
+            dbapi_conn.execute("PRAGMA foreign_keys=ON")
+
+        sa.event.listen(sa.engine.Engine, "connect", foreign_keys)
+        fd, ftemp = tempfile.mkstemp()
+        try:
+            conn = {"engine": "sqlite", "database": ftemp}
+            for layout in db.EDGES_LAYOUTS:
+                nw = db.YatelNetwork(
+                    mode="w", chunk_size=3, edges_layout=layout, **conn
+                )
+                elems = [
+                    dom.Haplotype(1), dom.Haplotype(2),
+                    dom.Fact(1, a=1), dom.Fact(2, a=2), dom.Fact(2, a=3),
+                    dom.Haplotype(3), dom.Edge(1, (1, 2)),
+                    dom.Edge(2, (2, 3)), dom.Edge(3, (1, 3))
+                ]
+                nw.add_elements(elems)
+                nw.confirm_changes()
+                self.assertEquals(
+                    nw.execute("PRAGMA foreign_keys").scalar(), 1
+                )
+                self.assertSameUnsortedContent(
+                    list(nw.haplotypes()) + list(nw.facts()) +
+                    list(nw.edges()), elems
+                )
+        finally:
+            sa.event.remove(sa.engine.Engine, "connect", foreign_keys)
+            os.close(fd)
+            os.remove(ftemp)
+
+    def test_confirm_changes_progress(self):
+        try:
+            fd, ftemp = tempfile.mkstemp()
+            conn = {"engine": "sqlite", "database": ftemp}
+            nw, haps = self.get_random_nw(dict(conn))
+            orig = {
+                "haplotypes": list(nw.haplotypes()),
+                "facts": list(nw.facts()),
+                "edges": list(nw.edges())
+            }
+            size = sum(len(v) for v in orig.values())
+
+            new_elems = [dom.Haplotype(100), dom.Haplotype(101),
+                         dom.Fact(100, faa="foo"), dom.Edge(19, [100, 101])]
+            calls = []
+            nw = db.YatelNetwork(mode="a", chunk_size=2, **conn)
+            nw.add_elements(new_elems)
+            nw.confirm_changes(progress=lambda *a: calls.append(a))
+
+            # the chunks written by add_elements are counted too
+            self.assertEquals(calls[-1], (4, 4))
+            self.assertLess(calls[0][0], 4)
+            dones = [done for done, total in calls]
+            self.assertEquals(dones, sorted(set(dones)))
+            for method, elems in orig.items():
+                elems.extend(
+                    e for e in new_elems if method[:4] in type(e).__name__.lower()
+                )
+                self.assertSameUnsortedContent(getattr(nw, method)(), elems)
+        except:
+            raise
+        finally:
+            os.close(fd)
+
+    def test_append_new_attributes(self):
+        try:
+            fd, ftemp = tempfile.mkstemp()
+            conn = {"engine": "sqlite", "database": ftemp}
+            nw, haps = self.get_random_nw(dict(conn))
+            fact_ids = [row.id for row in nw.execute(
+                nw.facts_table.select().order_by("id")
+            )]
+            indexes = set(i.name for i in nw.haplotypes_table.indexes)
+
+            nw = db.YatelNetwork(mode="a", **conn)
+            nw.add_elements([
+                dom.Haplotype(100, brand_new="attr"),
+                dom.Fact(100, other_new=1),
+                dom.Edge(19, [100, 0, 1])
+            ])
+            nw.confirm_changes()
+
+            desc = nw.describe()
+            self.assertIn("brand_new", desc["haplotype_attributes"])
+            self.assertIn("other_new", desc["fact_attributes"])
+            self.assertEquals(desc["edge_attributes"]["max_nodes"], 3)
+            self.assertEquals(
+                nw.haplotype_by_id(100), dom.Haplotype(100, brand_new="attr")
+            )
+            self.assertIn(dom.Edge(19, [100, 0, 1]), list(nw.edges()))
+
+            rs = [row.id for row in nw.execute(
+                nw.facts_table.select().order_by("id")
+            )]
+            self.assertEquals(rs[:-1], fact_ids)
+            rnw = db.YatelNetwork(**conn)
+            self.assertTrue(
+                indexes.issubset(i.name for i in rnw.haplotypes_table.indexes)
+            )
+        except:
+            raise
+        finally:
+            os.close(fd)
+
     def test_write(self):
         try:
             fd, ftemp = tempfile.mkstemp()
@@ -481,6 +912,164 @@ class YatelNetwork(YatelTestCase):
 
 
 
+class EdgesMembersLayout(YatelTestCase):
+
+    def setUp(self):
+        super(EdgesMembersLayout, self).setUp()
+        self.members = db.YatelNetwork(
+            "memory", mode="w", edges_layout=db.EDGES_MEMBERS, chunk_size=2
+        )
+        self.members.add_elements(self.nw.haplotypes())
+        self.members.add_elements(self.nw.facts())
+        self.members.add_elements(self.nw.edges())
+        self.members.confirm_changes()
+
+    def test_invalid_layout(self):
+        with self.assertRaises(ValueError):
+            db.YatelNetwork("memory", mode="w", edges_layout="foo")
+
+    def test_layout(self):
+        self.assertEquals(self.nw.edges_layout, db.EDGES_WIDE)
+        self.assertIsNone(self.nw.edge_members_table)
+        self.assertEquals(self.members.edges_layout, db.EDGES_MEMBERS)
+        self.assertIsNotNone(self.members.edge_members_table)
+
+    def test_edges(self):
+        self.assertSameUnsortedContent(self.members.edges(), self.nw.edges())
+
+    def test_edges_by_haplotype(self):
+        for hap in self.nw.haplotypes():
+            self.assertSameUnsortedContent(
+                self.members.edges_by_haplotype(hap),
+                self.nw.edges_by_haplotype(hap)
+            )
+
+    def test_edges_by_environment(self):
+        for env in self.nw.environments(["place"]):
+            self.assertSameUnsortedContent(
+                self.members.edges_by_environment(env),
+                self.nw.edges_by_environment(env)
+            )
+
+    def test_describe(self):
+        self.assertEquals(self.members.describe(), self.nw.describe())
+
+    def test_weights_array(self):
+        for env in self.nw.environments(["place"]):
+            self.assertEquals(
+                sorted(self.members.weights_array(env)),
+                sorted(self.nw.weights_array(env))
+            )
+
+    def test_weights_aggregates_by_environment(self):
+        for facts_attrs in [["place"], ["place", "native"]]:
+            orig = list(self.nw.weights_aggregates_by_environment(
+                facts_attrs=facts_attrs
+            ))
+            rs = list(self.members.weights_aggregates_by_environment(
+                facts_attrs=facts_attrs
+            ))
+            self.assertEqual(len(orig), len(rs))
+            for (oenv, oaggs), (renv, raggs) in zip(orig, rs):
+                self.assertEqual(oenv, renv)
+                for name, value in oaggs.items():
+                    if value is None:
+                        self.assertIsNone(raggs[name])
+                    else:
+                        self.assertAlmostEqual(raggs[name], value)
+
+    def test_hyperedges(self):
+        fd, ftemp = tempfile.mkstemp()
+        try:
+            conn = {"engine": "sqlite", "database": ftemp}
+            nw = db.YatelNetwork(mode="w", edges_layout=db.EDGES_MEMBERS, **conn)
+            nw.add_elements([
+                dom.Haplotype(1), dom.Haplotype(2), dom.Haplotype(3),
+                dom.Fact(1, place="a"), dom.Fact(2, place="a"),
+                dom.Fact(3, place="b"),
+                dom.Edge(1., (1, 2)), dom.Edge(2., (1, 2, 3))
+            ])
+            nw.confirm_changes()
+
+            nw = db.YatelNetwork(mode="a", **conn)
+            self.assertEquals(nw.edges_layout, db.EDGES_MEMBERS)
+            nw.add_elements([dom.Haplotype(4), dom.Edge(3., (1, 2, 3, 4))])
+            nw.confirm_changes()
+
+            nw = db.YatelNetwork(mode="r", **conn)
+            self.assertEquals(nw.edges_layout, db.EDGES_MEMBERS)
+            self.assertEquals(nw.describe()["edge_attributes"]["max_nodes"], 4)
+            self.assertEquals(
+                list(nw.edges()),
+                [dom.Edge(1., (1, 2)), dom.Edge(2., (1, 2, 3)),
+                 dom.Edge(3., (1, 2, 3, 4))]
+            )
+            self.assertEquals(
+                list(nw.edges_by_environment(place="a")), []
+            )
+            self.assertEquals(
+                list(nw.edges_by_haplotype(dom.Haplotype(4))),
+                [dom.Edge(3., (1, 2, 3, 4))]
+            )
+        finally:
+            os.close(fd)
+
+    def test_mixed_arity(self):
+        # only the edges with max_nodes haplotypes are in an environment
+        elems = [
+            dom.Haplotype(1), dom.Haplotype(2), dom.Haplotype(3),
+            dom.Haplotype(4),
+            dom.Fact(1, place="a"), dom.Fact(2, place="a"),
+            dom.Fact(3, place="a"), dom.Fact(4, place="b"),
+            dom.Edge(1., (1, 2)), dom.Edge(2., (1, 2, 3)),
+            dom.Edge(3., (1, 4)), dom.Edge(4., (1, 2, 4))
+        ]
+        wide = db.YatelNetwork("memory", mode="w")
+        wide.add_elements(elems)
+        wide.confirm_changes()
+        members = db.YatelNetwork(
+            "memory", mode="w", edges_layout=db.EDGES_MEMBERS
+        )
+        members.add_elements(elems)
+        members.confirm_changes()
+
+        self.assertEquals(
+            list(wide.edges_by_environment(place="a")),
+            [dom.Edge(2., (1, 2, 3))]
+        )
+        for env in wide.environments(["place"]):
+            self.assertSameUnsortedContent(
+                members.edges_by_environment(env),
+                wide.edges_by_environment(env)
+            )
+            self.assertEquals(
+                sorted(members.weights_array(env)),
+                sorted(wide.weights_array(env))
+            )
+        for layout in (wide, members):
+            rs = dict(
+                (env["place"], aggs)
+                for env, aggs in layout.weights_aggregates_by_environment(
+                    ["count", "sum"], ["place"]
+                )
+            )
+            self.assertEquals(rs, {"a": {"count": 1, "sum": 2.},
+                                   "b": {"count": 0, "sum": None}})
+
+    def test_confirm_changes_progress(self):
+        calls = []
+        nw = db.YatelNetwork(
+            "memory", mode="w", edges_layout=db.EDGES_MEMBERS, chunk_size=100
+        )
+        nw.add_elements([
+            dom.Haplotype(2), dom.Haplotype(3), dom.Haplotype(5),
+            dom.Edge(1., (2, 5)), dom.Edge(2., (3, 5))
+        ])
+        nw.confirm_changes(progress=lambda *a: calls.append(a))
+        # 3 haplotypes + 2 edges + 4 members
+        self.assertEquals(calls[-1], (9, 9))
+
+
 #===============================================================================
 # MAIN
 #===============================================================================
@@ -23,6 +23,8 @@ import datetime
 import collections
 import unittest
 
+import numpy as np
+
 from yatel import stats
 from yatel import typeconv
 from yatel.cluster import kmeans
@@ -55,6 +57,8 @@ class FunctionTest(core.YatelTestCase):
             orig = functions.pformat_data(fname)
             rs = self.execute("help", fname=fname)
             self.assertEquals(orig, rs)
+            self.assertIsInstance(fdata.doc, basestring)
+            self.assertEquals(fdata.func.__doc__, fdata.doc)
 
     def test_haplotypes(self):
         orig = tuple(self.nw.haplotypes())
@@ -116,6 +120,25 @@ class FunctionTest(core.YatelTestCase):
         rs = tuple(self.execute("environments"))
         self.assertSameUnsortedContent(rs, orig)
 
+        orig = tuple(self.nw.environments(
+            ["place"], with_counts=True, order_by="count", limit=2, offset=1
+        ))
+        rs = tuple(self.execute(
+            "environments", facts_attrs=["place"], with_counts=True,
+            order_by="count", limit=2, offset=1
+        ))
+        self.assertEqual(rs, orig)
+
+    def test_weights_aggregates_by_environment(self):
+        orig = list(self.nw.weights_aggregates_by_environment(
+            ["count", "avg"], ["place"]
+        ))
+        rs = list(self.execute(
+            "weights_aggregates_by_environment",
+            aggregates=["count", "avg"], facts_attrs=["place"]
+        ))
+        self.assertEqual(orig, rs)
+
     def test_env2weightarray(self):
         for env in list(self.nw.environments()) + [None]:
             orig = list(stats.env2weightarray(self.nw, env))
@@ -208,6 +231,25 @@ class FunctionTest(core.YatelTestCase):
                 self.assertAlmostEqual(orig_arr, rs_arr, places=4)
                 self.assertAlmostEqual(orig_nw, orig_arr, places=4)
 
+    def test_skew(self):
+        for env in list(self.nw.environments()) + [None]:
+            arr = stats.env2weightarray(self.nw, env)
+            if len(arr):
+                orig_nw = stats.skew(self.nw, env)
+                rs_nw = self.execute("skew", env=env)
+                self.assertAlmostEqual(orig_nw, rs_nw, places=4)
+
+    def test_stats_describe(self):
+        names = ["average", "std", "range"]
+        for env in list(self.nw.environments()) + [None]:
+            arr = stats.env2weightarray(self.nw, env)
+            if len(arr):
+                orig = stats.describe(self.nw, env, names)
+                rs = self.execute("stats_describe", env=env, stats=names)
+                self.assertEqual(set(orig), set(rs))
+                for name in names:
+                    self.assertAlmostEqual(orig[name], rs[name], places=4)
+
     def test_amax(self):
         for env in list(self.nw.environments()) + [None]:
             arr = stats.env2weightarray(self.nw, env)
@@ -846,6 +888,16 @@ class FunctionTest(core.YatelTestCase):
         self.assertEquals(orig[0], rs[0])
         self.assertEquals(orig[1], rs[1])
 
+    def test_minibatch_kmeans(self):
+        envs = tuple(self.nw.environments(["native", "place"]))
+        orig = kmeans.minibatch_kmeans(
+            self.nw, envs=envs, k_or_guess=2, seed=3
+        )
+        rs = self.execute("minibatch_kmeans", envs=envs, k_or_guess=2, seed=3)
+        self.assertTrue(np.allclose(orig[0], rs[0]))
+        self.assertAlmostEqual(orig[1], rs[1])
+        self.assertTrue((orig[2] == rs[2]).all())
+
 
 #==============================================================================
 # QBJ
@@ -895,6 +947,24 @@ class QBJEngineTest(core.YatelTestCase):
         rs = typeconv.parse(self.execute(query)["result"])
         self.assertAlmostEqual(orig, rs, places=4)
 
+    def test_weights_aggregates_by_environment(self):
+        query = {
+            "id": 1,
+            "function": {
+                "name": 'weights_aggregates_by_environment',
+                "kwargs": {
+                    "aggregates": {"type": 'literal', "value": ["count"]},
+                    "facts_attrs": {"type": 'literal', "value": ["place"]}
+                }
+            }
+        }
+        orig = list(
+            self.nw.weights_aggregates_by_environment(["count"], ["place"])
+        )
+        orig = typeconv.parse(typeconv.simplifier(orig))
+        rs = typeconv.parse(self.execute(query)["result"])
+        self.assertEqual(orig, rs)
+
     def test_haplotype_by_id_with_slice(self):
         query = {
             "id": 1545454845,
@@ -1010,6 +1080,145 @@ class QBJEngineTest(core.YatelTestCase):
         self.assertEquals(orig[1], rs[1])
 
 
+class QBJEngineCacheTest(core.YatelTestCase):
+
+    def query(self, query_id, name, **kwargs):
+        return {
+            "id": query_id,
+            "function": {
+                "name": name,
+                "kwargs": dict(
+                    (k, {"type": "literal", "value": v})
+                    for k, v in kwargs.items()
+                )
+            }
+        }
+
+    @unittest.skipUnless(core.MOCK, "require mock")
+    def test_cache(self):
+        engine = qbj.QBJEngine(self.nw)
+        with core.patch(
+            "yatel.qbj.functions.execute", wraps=functions.execute
+        ) as execute:
+            rs0 = engine.execute(self.query(1, "haplotypes"))
+            rs1 = engine.execute(self.query(2, "haplotypes"))
+            self.assertEqual(execute.call_count, 1)
+        self.assertEqual((rs0["id"], rs1["id"]), (1, 2))
+        self.assertEqual(rs0["result"], rs1["result"])
+        self.assertEqual(engine.cache_info(), (1, 1, qbj.core.CACHE_SIZE, 1))
+
+        # the results are copies of the cached one
+        rs1["result"]["value"].pop()
+        rs2 = engine.execute(self.query(3, "haplotypes"))
+        self.assertEqual(rs0["result"], rs2["result"])
+
+        engine.clear_cache()
+        self.assertEqual(engine.cache_info(), (0, 0, qbj.core.CACHE_SIZE, 0))
+
+    def test_cache_key(self):
+        engine = qbj.QBJEngine(self.nw)
+        q0 = self.query(1, "slice", iterable=[1, 2, 3], f=0, t=2)
+        q1 = self.query("other", "slice", t=2, f=0, iterable=[1, 2, 3])
+        q2 = self.query(1, "slice", iterable=[1, 2, 3], f=0, t=1)
+        self.assertEqual(
+            engine.cache_key(q0["function"]), engine.cache_key(q1["function"])
+        )
+        self.assertNotEqual(
+            engine.cache_key(q0["function"]), engine.cache_key(q2["function"])
+        )
+        nested = {
+            "name": "size",
+            "args": [{"type": "literal", "function": {"name": "utcnow"}}]
+        }
+        self.assertIsNone(engine.cache_key({"name": "utcnow"}))
+        self.assertIsNone(engine.cache_key(nested))
+        self.assertIsNone(engine.cache_key({"name": "foo"}))
+        self.assertIsNone(
+            qbj.QBJEngine(self.nw, cache_size=0).cache_key(q0["function"])
+        )
+
+    def test_non_deterministic(self):
+        engine = qbj.QBJEngine(self.nw)
+        for query_id in range(3):
+            rs = engine.execute(self.query(query_id, "utcnow"))
+            self.assertFalse(rs["error"])
+        self.assertEqual(engine.cache_info(), (0, 0, qbj.core.CACHE_SIZE, 0))
+
+    def test_lru(self):
+        engine = qbj.QBJEngine(self.nw, cache_size=2)
+        for value in [1, 2, 1, 3, 2, 1]:
+            rs = engine.execute(self.query(None, "slice", iterable=[value], f=0))
+            self.assertFalse(rs["error"])
+        # only the second 1 is a hit: 3 evicts 2, 2 evicts 1 and 1 evicts 3
+        self.assertEqual(engine.cache_info(), (1, 5, 2, 2))
+
+        engine = qbj.QBJEngine(self.nw, cache_size=0)
+        engine.execute(self.query(None, "ping"))
+        engine.execute(self.query(None, "ping"))
+        self.assertEqual(engine.cache_info(), (0, 0, 0, 0))
+
+
+class QBJResolverTest(core.YatelTestCase):
+
+    def call(self, name, *args, **kwargs):
+        function = {"name": name}
+        if args:
+            function["args"] = list(args)
+        if kwargs:
+            function["kwargs"] = kwargs
+        return {"type": "literal", "function": function}
+
+    def lit(self, value):
+        return {"type": "literal", "value": value}
+
+    def test_shared_calls(self):
+        haps = self.call("haplotypes")
+        function = self.call(
+            "minus",
+            self.call("size", self.call("sort", iterable=haps)),
+            self.call("size", self.call(
+                "sort", iterable=haps, reverse=self.lit(True)
+            ))
+        )["function"]
+        shared = qbj.core.shared_calls(function)
+        self.assertEqual(
+            shared, frozenset([qbj.core.function_key(haps["function"])])
+        )
+        function = self.call(
+            "minus", self.call("utcnow"), self.call("utcnow")
+        )["function"]
+        self.assertEqual(qbj.core.shared_calls(function), frozenset())
+
+    @unittest.skipUnless(core.MOCK, "require mock")
+    def test_memoization(self):
+        haps = self.call("haplotypes")
+        sizes = [
+            self.call("size", self.call("sort", iterable=haps)),
+            self.call("size", self.call(
+                "sort", iterable=haps, reverse=self.lit(True)
+            ))
+        ]
+        function = self.call("minus", *sizes)["function"]
+        with core.patch(
+            "yatel.qbj.functions.execute", wraps=functions.execute
+        ) as execute:
+            rs = qbj.core.QBJResolver(function, self.nw).resolve()
+            names = [c[0][0] for c in execute.call_args_list]
+        self.assertEqual(rs, 0)
+        self.assertEqual(names.count("haplotypes"), 1)
+        self.assertEqual(names.count("sort"), 2)
+
+        # the same size is calculated once
+        function = self.call("minus", sizes[0], sizes[0])["function"]
+        with core.patch(
+            "yatel.qbj.functions.execute", wraps=functions.execute
+        ) as execute:
+            rs = qbj.core.QBJResolver(function, self.nw).resolve()
+            names = [c[0][0] for c in execute.call_args_list]
+        self.assertEqual(rs, 0)
+        self.assertEqual(names, ["haplotypes", "sort", "size", "minus"])
+
+
 #==============================================================================
 # MAIN
 #==============================================================================
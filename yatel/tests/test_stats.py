@@ -214,6 +214,48 @@ class TestStats(YatelTestCase):
             else:
                 self.assertAlmostEqual(orig, rs, self.places)
 
+    def test_skew(self):
+        orig = statsbis.skew(self.warr)
+        rs = stats.skew(self.nw)
+        self.assertAlmostEqual(orig, rs, self.places)
+        for env in self.nw.environments():
+            orig = statsbis.skew(self.warrenv[env])
+            rs = stats.skew(self.nw, env)
+            if np.isnan(orig) or np.isnan(rs):
+                self.assertTrue(np.isnan(orig) and np.isnan(rs))
+            else:
+                self.assertAlmostEqual(orig, rs, self.places)
+
+    def test_describe(self):
+        rs = stats.describe(self.nw)
+        self.assertEqual(set(rs), set(stats.DESCRIBE_STATS))
+        for name, func in stats.DESCRIBE_STATS.items():
+            if name == "percentile":
+                self.assertNDArrayEquals(
+                    rs[name], func(self.nw, (25, 50, 75))
+                )
+            elif name == "mode":
+                self.assertNDArrayEquals(rs[name], func(self.nw))
+            else:
+                self.assertAlmostEqual(rs[name], func(self.nw), self.places)
+        names = ["average", "std", "percentile", "min"]
+        for env in self.nw.environments():
+            rs = stats.describe(self.nw, env, names, q=10)
+            self.assertEqual(set(rs), set(names))
+            if len(self.warrenv[env]):
+                self.assertAlmostEqual(
+                    rs["percentile"], stats.percentile(self.nw, 10, env),
+                    self.places
+                )
+                self.assertAlmostEqual(
+                    rs["min"], stats.min(self.nw, env), self.places
+                )
+            else:
+                self.assertTrue(np.isnan(rs["min"]))
+                self.assertTrue(np.isnan(rs["percentile"]))
+        with self.assertRaises(ValueError):
+            stats.describe(self.nw, stats=["foo"])
+
     def test_percentiles(self):
         orig = np.percentile(self.warr, 25)
         rs = stats.percentile(self.nw, 25)
@@ -259,6 +301,16 @@ class TestStats(YatelTestCase):
                 with self.assertRaises(ValueError):
                     rs = stats.mode(self.nw, env)
 
+    def test_array_fallback(self):
+        for func in (stats.average, stats.min, stats.max, stats.amin,
+                     stats.amax, stats.sum, stats.var, stats.std,
+                     stats.range):
+            self.assertAlmostEqual(
+                func(self.nw), func(self.warr), self.places
+            )
+            with self.assertRaises(ValueError):
+                func(self.warr, {"foo": "bar"})
+
     def test_weights2array(self):
         orig = self.warr
         rs = stats.weights2array(self.nw.edges())
@@ -273,6 +325,11 @@ class TestStats(YatelTestCase):
             rs = stats.env2weightarray(self.nw, env)
             self.assertNDArrayEquals(orig, rs)
 
+        # the cached array of the network is shared without copies
+        rs = stats.env2weightarray(self.nw)
+        self.assertIs(stats.env2weightarray(self.nw), rs)
+        self.assertFalse(rs.flags.writeable)
+
 
 # ===============================================================================
 # MAIN
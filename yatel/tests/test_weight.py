@@ -17,9 +17,18 @@
 # IMPORTS
 #==============================================================================
 
+import os
+import shutil
+import tempfile
 import itertools
+import random
 
-from yatel import weight
+import numpy as np
+
+from scipy.spatial import distance
+
+from yatel import db, dom, weight
+from yatel.weight import core, levenshtein, matrix
 from yatel.tests.core import YatelTestCase
 
 
@@ -53,6 +62,365 @@ class TestWeights(YatelTestCase):
             for v in wgths.values():
                 self.assertAllTheSame(v)
 
+    def test_vectorized(self):
+        haps = list(self.nw.haplotypes()) + [
+            dom.Haplotype("x", attr=None), dom.Haplotype("y", attr=1),
+            dom.Haplotype("z", attr=1.0, other=u"n")
+        ]
+        for calc in weight.SYNONYMS:
+            calculator = weight.CALCULATORS[tuple(calc)[0]]()
+            if not calculator.vectorized:
+                continue
+            for to_same in [True, False]:
+                comb = (
+                    itertools.combinations_with_replacement
+                    if to_same else itertools.combinations
+                )
+                orig = [
+                    ((h0, h1), calculator.weight(h0, h1))
+                    for h0, h1 in comb(haps, 2)
+                ]
+                rs = list(calculator.weights(haps, to_same))
+                self.assertEqual(len(orig), len(rs))
+                for (opair, ow), (rpair, rw) in zip(orig, rs):
+                    self.assertEqual(opair, rpair)
+                    self.assertAlmostEqual(ow, rw)
+
+    def test_hamming_sets(self):
+        def hamming(hap0, hap1):
+            names = set(hap0.keys()) | set(hap1.keys())
+            return sum(
+                1 for name in names
+                if name not in hap0 or name not in hap1
+                or hap0[name] != hap1[name]
+            )
+
+        values = [1, 1.0, True, 2, u"a", "b", None]
+        haps = list(self.nw.haplotypes())
+        for idx in range(30):
+            attrs = dict(
+                ("attr{}".format(jdx), random.choice(values))
+                for jdx in range(random.randint(0, 5))
+            )
+            haps.append(dom.Haplotype("r{}".format(idx), **attrs))
+        calculator = weight.CALCULATORS["hamming"]()
+        for hap0, hap1 in itertools.combinations(haps, 2):
+            self.assertEqual(calculator.weight(hap0, hap1), hamming(hap0, hap1))
+
+        # the same calculator with other haplotypes with the same ids
+        for hap0, hap1 in itertools.combinations(haps, 2):
+            hap0 = dom.Haplotype(hap0.hap_id, attr0="other")
+            self.assertEqual(calculator.weight(hap0, hap1), hamming(hap0, hap1))
+
+        hmatrix = matrix.HaplotypesMatrix(haps)
+        encoded = calculator.encode(hmatrix)
+        self.assertEqual(encoded.dtype, np.int8)
+        self.assertTrue(np.all(encoded == hmatrix.codes))
+
+    def test_tiles(self):
+        for size in range(6):
+            for to_same in [True, False]:
+                tiles = list(core.tiles(size, to_same, 3))
+                rows = [idx for start, stop in tiles
+                        for idx in range(start, stop)]
+                self.assertEqual(rows, range(size))
+
+    def test_n_jobs(self):
+        tile_size, core.TILE_SIZE = core.TILE_SIZE, 2
+        try:
+            for calc in weight.SYNONYMS:
+                calcname = tuple(calc)[0]
+                for to_same in [True, False]:
+                    orig = list(weight.weights(calcname, self.nw, to_same))
+                    rs = list(weight.weights(
+                        calcname, self.nw, to_same, n_jobs=2
+                    ))
+                    self.assertEqual(orig, rs)
+                    rs = list(weight.weights(
+                        calcname, self.nw, to_same, n_jobs=-1, ordered=False
+                    ))
+                    self.assertSameUnsortedContent(orig, rs)
+        finally:
+            core.TILE_SIZE = tile_size
+
+    def test_projections(self):
+        haps = list(self.nw.haplotypes())
+        for calc in weight.SYNONYMS:
+            calculator = weight.CALCULATORS[tuple(calc)[0]]()
+            keys = calculator.projections(haps)
+            for idx, jdx in itertools.combinations(range(len(haps)), 2):
+                w = calculator.weight(haps[idx], haps[jdx])
+                self.assertLessEqual(abs(keys[idx] - keys[jdx]), w + 1e-9)
+
+        # the missing attributes are not empty sequences
+        haps = [dom.Haplotype(1, a="missing"), dom.Haplotype(2, b="y"),
+                dom.Haplotype(3, a="x", b="missin"), dom.Haplotype(4)]
+        to_seq = lambda obj: "missing" if obj is None else unicode(obj)
+        calculator = levenshtein.Levenshtein(to_seq)
+        keys = calculator.projections(haps)
+        weights = {}
+        for idx, jdx in itertools.combinations(range(len(haps)), 2):
+            w = calculator.weight(haps[idx], haps[jdx])
+            self.assertLessEqual(abs(keys[idx] - keys[jdx]), w)
+            weights[(haps[idx].hap_id, haps[jdx].hap_id)] = w
+        for max_weight in sorted(set(weights.values())):
+            rs = calculator.edges(haps, max_weight=max_weight)
+            self.assertEqual(
+                sorted(e.haps_id for e in rs),
+                sorted(k for k, w in weights.items() if w <= max_weight)
+            )
+
+    def test_edges(self):
+        haps = list(self.nw.haplotypes())
+        for calc in weight.SYNONYMS:
+            calcname = tuple(calc)[0]
+            weights = dict(
+                ((h0.hap_id, h1.hap_id), w)
+                for (h0, h1), w in weight.weights(calcname, haps)
+            )
+            for max_weight in sorted(set(weights.values())):
+                orig = sorted(k for k, w in weights.items() if w <= max_weight)
+                rs = list(weight.edges(calcname, haps, max_weight=max_weight))
+                self.assertEqual(sorted(e.haps_id for e in rs), orig)
+                for edge in rs:
+                    self.assertIsInstance(edge, dom.Edge)
+                    self.assertAlmostEqual(
+                        edge.weight, weights[tuple(edge.haps_id)]
+                    )
+            for k in range(1, len(haps)):
+                rs = list(weight.edges(calcname, haps, k=k))
+                for hap in haps:
+                    dists = sorted(
+                        w for pair, w in weights.items() if hap.hap_id in pair
+                    )
+                    near = [e.weight for e in rs if hap.hap_id in e.haps_id]
+                    self.assertGreaterEqual(len(near), k)
+                    # the k nearest are connected
+                    self.assertLessEqual(
+                        sorted(near)[k - 1], dists[k - 1] + 1e-9
+                    )
+            rs = list(weight.edges(calcname, self.nw, k=1, max_weight=-1))
+            self.assertEqual(rs, [])
+        with self.assertRaises(ValueError):
+            list(weight.edges("ham", haps))
+
+    def test_encodings_cache(self):
+        haps = list(self.nw.haplotypes())
+        calls = []
+
+        def to_seq(obj):
+            if obj is not None:
+                calls.append(obj)
+            return levenshtein.to_seq_default(obj)
+
+        calculator = levenshtein.Levenshtein(to_seq)
+        orig = [
+            weight.weight("lev", h0, h1)
+            for h0, h1 in itertools.combinations(haps, 2)
+        ]
+        # every run encodes every haplotype once
+        attrs = sum(len(hap) for hap in haps)
+        rs = [w for _, w in calculator.weights(haps)]
+        self.assertEqual(orig, rs)
+        self.assertEqual(len(calls), attrs)
+        rs = [w for _, w in calculator.weights(haps)]
+        self.assertEqual(orig, rs)
+        self.assertEqual(len(calls), 2 * attrs)
+        max_weight = max(orig)
+        edges = list(calculator.edges(haps, max_weight=max_weight))
+        self.assertEqual(sorted(e.weight for e in edges), sorted(orig))
+        self.assertEqual(len(calls), 3 * attrs)
+        dists = matrix.pdist(calculator, haps)
+        self.assertEqual(dists.tolist(), orig)
+        self.assertEqual(len(calls), 4 * attrs)
+
+        # weight always encodes the given haplotypes
+        for hap0, hap1 in itertools.combinations(haps, 2):
+            other = dom.Haplotype(hap0.hap_id, attr0="other")
+            self.assertEqual(
+                calculator.weight(other, hap1),
+                weight.weight("lev", other, hap1)
+            )
+            self.assertEqual(
+                calculator.weight(hap0, hap1),
+                weight.weight("lev", hap0, hap1)
+            )
+
+    def test_bounded_distances(self):
+        self.assertEqual(levenshtein.levenshtein("kitten", "sitting"), 3)
+        self.assertEqual(levenshtein.dameraulevenshtein("abcd", "acbd"), 1)
+        self.assertEqual(levenshtein.levenshtein("abcd", "acbd"), 2)
+        self.assertEqual(levenshtein.dameraulevenshtein("", "abc"), 3)
+        for _ in range(200):
+            a = "".join(random.choice("abc") for _ in range(random.randint(0, 8)))
+            b = "".join(random.choice("abc") for _ in range(random.randint(0, 8)))
+            for func in (levenshtein.levenshtein,
+                         levenshtein.dameraulevenshtein):
+                dist = func(a, b)
+                self.assertEqual(dist, func(b, a))
+                for max_distance in range(8):
+                    rs = func(a, b, max_distance)
+                    if dist <= max_distance:
+                        self.assertEqual(rs, dist)
+                    else:
+                        self.assertEqual(rs, max_distance + 1)
+
+        # long and similar sequences only use the band of the table
+        a = "abcd" * 50
+        b = a[:60] + "x" + a[60:100] + a[101:]
+        b = b[:150] + b[151] + b[150] + b[152:]
+        for func in (levenshtein.levenshtein, levenshtein.dameraulevenshtein):
+            dist = func(a, b)
+            for max_distance in range(dist + 2):
+                rs = func(a, b, max_distance)
+                self.assertEqual(rs, min(dist, max_distance + 1))
+        self.assertEqual(levenshtein.dameraulevenshtein(a, b), 3)
+
+    def test_bounded_weight(self):
+        haps = list(self.nw.haplotypes())
+        for calc in weight.SYNONYMS:
+            calculator = weight.CALCULATORS[tuple(calc)[0]]()
+            for h0, h1 in itertools.combinations(haps, 2):
+                w = calculator.weight(h0, h1)
+                for max_weight in (0, w / 2., w, w + 1):
+                    rs = calculator.bounded_weight(h0, h1, max_weight)
+                    if w <= max_weight:
+                        self.assertAlmostEqual(rs, w)
+                    else:
+                        self.assertGreater(rs, max_weight)
+
+    def test_build_edges(self):
+        haps = list(self.nw.haplotypes())
+        for calc in weight.SYNONYMS:
+            calcname = tuple(calc)[0]
+            weights = dict(
+                ((h0.hap_id, h1.hap_id), w)
+                for (h0, h1), w in weight.weights(calcname, self.nw)
+            )
+            max_weight = sorted(weights.values())[len(weights) // 2]
+            for kwargs in [{}, {"n_jobs": 2}, {"max_weight": max_weight}]:
+                dst_nw = db.YatelNetwork("memory", mode=db.MODE_WRITE,
+                                         chunk_size=3)
+                dst_nw.add_elements(haps)
+                count = weight.build_edges(calcname, self.nw, dst_nw, **kwargs)
+                dst_nw.confirm_changes()
+                rs = dict(
+                    (tuple(e.haps_id), e.weight) for e in dst_nw.edges()
+                )
+                orig = dict(
+                    (k, w) for k, w in weights.items()
+                    if w <= kwargs.get("max_weight", w)
+                )
+                self.assertEqual(count, len(orig))
+                self.assertEqual(sorted(rs), sorted(orig))
+                for key, w in orig.items():
+                    self.assertAlmostEqual(rs[key], w)
+
+            dst_nw = db.YatelNetwork("memory", mode=db.MODE_WRITE)
+            for kwargs in [{"to_same": True}, {"n_jobs": 2}]:
+                for mode in [{"max_weight": max_weight}, {"k": 2}]:
+                    kwargs.update(mode)
+                    with self.assertRaises(ValueError):
+                        weight.build_edges(calcname, self.nw, dst_nw, **kwargs)
+
+    def test_pdist(self):
+        for calc in weight.SYNONYMS:
+            calcname = tuple(calc)[0]
+            haps, dists = weight.pdist(calcname, self.nw)
+            square = distance.squareform(dists)
+            for idx, jdx in itertools.combinations(range(len(haps)), 2):
+                self.assertAlmostEqual(
+                    square[idx, jdx],
+                    weight.weight(calcname, haps[idx], haps[jdx])
+                )
+            for env in self.nw.environments():
+                haps, dists = weight.pdist(calcname, self.nw, env)
+                self.assertEqual(len(dists), len(haps) * (len(haps) - 1) / 2)
+
+    def test_pdist_store(self):
+        store = tempfile.mkdtemp()
+        try:
+            for calc in weight.SYNONYMS:
+                calcname = tuple(calc)[0]
+                orig_haps, orig = weight.pdist(calcname, self.nw)
+                haps, rs = weight.pdist(calcname, self.nw, store=store)
+                self.assertEqual(haps, orig_haps)
+                self.assertEqual(rs.tolist(), orig.tolist())
+                fnames = os.listdir(store)
+                stats = [os.stat(os.path.join(store, f)) for f in fnames]
+                haps, rs = weight.pdist(calcname, self.nw, store=store)
+                self.assertEqual(fnames, os.listdir(store))
+                self.assertEqual(
+                    stats, [os.stat(os.path.join(store, f)) for f in fnames]
+                )
+                self.assertIsInstance(rs, np.memmap)
+                self.assertEqual(rs.tolist(), orig.tolist())
+            self.assertEqual(len(os.listdir(store)), len(weight.SYNONYMS))
+
+            haps = list(self.nw.haplotypes())[:-1]
+            weight.pdist("ham", haps, store=store)
+            self.assertEqual(
+                len(os.listdir(store)), len(weight.SYNONYMS) + 1
+            )
+        finally:
+            shutil.rmtree(store)
+
+    def test_haplotypes_matrix(self):
+        hmatrix = matrix.HaplotypesMatrix([
+            dom.Haplotype(1, a="x"), dom.Haplotype(2, a="y", b=1),
+            dom.Haplotype(3, a="x", b=2)
+        ])
+        self.assertEqual(hmatrix.names, ("a", "b", "hap_id"))
+        self.assertEqual(
+            hmatrix.codes.tolist(), [[0, -1, 0], [1, 0, 1], [0, 1, 2]]
+        )
+        self.assertEqual(
+            hmatrix.missing.tolist(),
+            [[False, True, False], [False, False, False],
+             [False, False, False]]
+        )
+        nums = hmatrix.to_num(lambda v: 7 if v == "" else 1)
+        self.assertEqual(nums[0].tolist(), [1, 7, 1])
+
+    def test_blocks(self):
+        haps = list(self.nw.haplotypes())
+        for calc in weight.SYNONYMS:
+            calculator = weight.CALCULATORS[tuple(calc)[0]]()
+            if not calculator.vectorized:
+                continue
+            encoded = calculator.encode(matrix.HaplotypesMatrix(haps))
+            full = calculator.weights_block(encoded, 0, len(haps))
+            for to_same in [True, False]:
+                offset = 0 if to_same else 1
+                shapes = []
+                weights_block = calculator.weights_block
+
+                def recorder(encoded, start, stop, cstart=0):
+                    block = weights_block(encoded, start, stop, cstart)
+                    shapes.append((start, block.shape[1]))
+                    return block
+
+                calculator.weights_block = recorder
+                # blocks of 3 rows
+                size = 3 * encoded.shape[0] * encoded.shape[1]
+                orig_cells, matrix.BLOCK_CELLS = matrix.BLOCK_CELLS, size
+                try:
+                    rs = list(matrix.blocks(calculator, encoded, to_same))
+                finally:
+                    matrix.BLOCK_CELLS = orig_cells
+                    del calculator.weights_block
+                self.assertEqual([idx for idx, _ in rs], range(len(haps)))
+                for idx, dists in rs:
+                    self.assertEqual(dists.dtype, full.dtype)
+                    self.assertEqual(
+                        dists.tolist(), full[idx, idx + offset:].tolist()
+                    )
+                for start, width in shapes:
+                    self.assertEqual(width, len(haps) - start - offset)
+
+                for (hap0, hap1), w in calculator.weights(haps, to_same):
+                    self.assertIsInstance(w, full.dtype.type)
+
 
 
 #===============================================================================
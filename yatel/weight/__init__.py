@@ -23,10 +23,14 @@ elements that can be used as edge weights.
 # IMPORTS
 #==============================================================================
 
+import os
+import hashlib
 import inspect
 
+from yatel import db, dom
+from yatel.weight import core
 from yatel.weight.core import BaseWeight
-from yatel.weight import euclidean, hamming, levenshtein
+from yatel.weight import euclidean, hamming, levenshtein, matrix
 
 
 #==============================================================================
@@ -73,7 +77,8 @@ def weight(calcname, hap0, hap1):
     return calculator.weight(hap0, hap1)
 
 
-def weights(calcname, nw, to_same=False, env=None, **kwargs):
+def weights(calcname, nw, to_same=False, env=None, n_jobs=1, ordered=True,
+            **kwargs):
     """Calculates the distance between all combinations of existing haplotypes
     in the network enviroment or a collection by the given 
     calculator algorithm.
@@ -90,6 +95,12 @@ def weights(calcname, nw, to_same=False, env=None, **kwargs):
     env : dict or None
         Enviroment dictionary only if ``nw`` is 
         :py:class:`yatel.db.YatelNetwork` instance.
+    n_jobs : int
+        Number of processes used to compute the weights (``-1`` use all the
+        cpus).
+    ordered : bool
+        If ``False`` and ``n_jobs`` is not ``1`` the weights are returned
+        as soon as they are calculated.
     kwargs : 
         Variable parameters to use as enviroment filters only if ``nw`` is 
         :py:class:`yatel.db.YatelNetwork` instance.
@@ -126,7 +137,198 @@ def weights(calcname, nw, to_same=False, env=None, **kwargs):
     """
     cls = CALCULATORS[calcname]
     calculator = cls()
-    return calculator.weights(nw=nw, to_same=to_same, env=env, **kwargs)
+    return calculator.weights(
+        nw=nw, to_same=to_same, env=env, n_jobs=n_jobs, ordered=ordered,
+        **kwargs
+    )
+
+
+def edges(calcname, nw, max_weight=None, k=None, env=None, **kwargs):
+    """Creates the :py:class:`yatel.dom.Edge` between the haplotypes of the
+    network enviroment or a collection with weight lower or equal than
+    ``max_weight`` and/or between every haplotype and their ``k`` nearest
+    neighbours, without calculate the weight of all the pairs.
+
+    Parameters
+    ----------
+    calcname : string
+        Registered calculator name (see: `yatel.weight.calculators`)
+    nw : :py:class:`yatel.db.YatelNetwork` or :py:class:`yatel.dom.Haplotype`
+        :py:class:`yatel.db.YatelNetwork` instance or iterable of
+        :py:class:`yatel.dom.Haplotype` instances.
+    max_weight : float or None
+        The max weight of the edges.
+    k : int or None
+        How many nearest neighbours of every haplotype are connected.
+    env : dict or None
+        Enviroment dictionary only if ``nw`` is
+        :py:class:`yatel.db.YatelNetwork` instance.
+    kwargs :
+        Variable parameters to use as enviroment filters only if ``nw`` is
+        :py:class:`yatel.db.YatelNetwork` instance.
+
+    Returns
+    -------
+    Iterator
+        Of :py:class:`yatel.dom.Edge`.
+
+    Examples
+    --------
+
+    >>> new_nw.add_elements(weight.edges("ham", nw, max_weight=2))
+
+    """
+    cls = CALCULATORS[calcname]
+    calculator = cls()
+    return calculator.edges(
+        nw=nw, max_weight=max_weight, k=k, env=env, **kwargs
+    )
+
+
+def build_edges(calcname, src_nw, dst_nw, to_same=False, env=None,
+                max_weight=None, k=None, n_jobs=1, **kwargs):
+    """Calculates the weights between the haplotypes of ``src_nw`` and
+    writes them as :py:class:`yatel.dom.Edge` in ``dst_nw``.
+
+    The weights are streamed to the buffer of ``dst_nw`` that is written
+    with bulk inserts of ``chunk_size`` rows, so the memory used doesn't
+    depend on the number of edges. ``dst_nw`` must be in **w** or **a** mode
+    and is your responsability to call ``dst_nw.confirm_changes()`` after
+    the build.
+
+    Parameters
+    ----------
+    calcname : string
+        Registered calculator name (see: `yatel.weight.calculators`)
+    src_nw : :py:class:`yatel.db.YatelNetwork` or :py:class:`yatel.dom.Haplotype`
+        :py:class:`yatel.db.YatelNetwork` instance or iterable of
+        :py:class:`yatel.dom.Haplotype` instances.
+    dst_nw : :py:class:`yatel.db.YatelNetwork`
+        Network in **w** or **a** mode where the edges are added.
+    to_same : bool
+        If ``True`` creates the edges between the same haplotype (only if
+        ``max_weight`` and ``k`` are ``None``).
+    env : dict or None
+        Enviroment dictionary only if ``src_nw`` is
+        :py:class:`yatel.db.YatelNetwork` instance.
+    max_weight : float or None
+        If is not ``None`` only the edges with weight lower or equal are
+        created (see: :py:func:`yatel.weight.edges`).
+    k : int or None
+        If is not ``None`` only the edges between every haplotype and their
+        ``k`` nearest neighbours are created (see:
+        :py:func:`yatel.weight.edges`).
+    n_jobs : int
+        Number of processes used to compute the weights of all the pairs
+        (``-1`` use all the cpus). Only if ``max_weight`` and ``k`` are
+        ``None``.
+    kwargs :
+        Variable parameters to use as enviroment filters only if ``src_nw``
+        is :py:class:`yatel.db.YatelNetwork` instance.
+
+    Returns
+    -------
+    int
+        The number of edges added to ``dst_nw``.
+
+    Raises
+    ------
+    ValueError
+        If ``to_same`` or ``n_jobs`` are used with ``max_weight`` or ``k``.
+
+    Examples
+    --------
+
+    >>> dst_nw = db.YatelNetwork("sqlite", mode=db.MODE_WRITE,
+    ...                          database="nw.db")
+    >>> dst_nw.add_elements(src_nw.haplotypes())
+    >>> weight.build_edges("ham", src_nw, dst_nw, max_weight=2)
+    3
+    >>> dst_nw.confirm_changes()
+
+    """
+    if max_weight is None and k is None:
+        edges_gen = (
+            dom.Edge(w, (hap0.hap_id, hap1.hap_id))
+            for (hap0, hap1), w in weights(
+                calcname, src_nw, to_same=to_same, env=env, n_jobs=n_jobs,
+                ordered=False, **kwargs
+            )
+        )
+    else:
+        if to_same or n_jobs != 1:
+            msg = "to_same and n_jobs can't be used with max_weight or k"
+            raise ValueError(msg)
+        edges_gen = edges(
+            calcname, src_nw, max_weight=max_weight, k=k, env=env, **kwargs
+        )
+    count = 0
+    for edge in edges_gen:
+        dst_nw.add_element(edge)
+        count += 1
+    return count
+
+
+def pdist(calcname, nw, env=None, store=None, **kwargs):
+    """Calculates the distance between all combinations of existing
+    haplotypes in the network enviroment or a collection as a condensed
+    distance matrix.
+
+    Hamming and Euclidean distances are calculated with the vectorized
+    engine of :py:mod:`yatel.weight.matrix`.
+
+    Parameters
+    ----------
+    calcname : string
+        Registered calculator name (see: `yatel.weight.calculators`)
+    nw : :py:class:`yatel.db.YatelNetwork` or :py:class:`yatel.dom.Haplotype`
+        :py:class:`yatel.db.YatelNetwork` instance or iterable of
+        :py:class:`yatel.dom.Haplotype` instances.
+    env : dict or None
+        Enviroment dictionary only if ``nw`` is
+        :py:class:`yatel.db.YatelNetwork` instance.
+    store : str or None
+        A directory to store the distance matrices. The matrix is saved as
+        ``.npy`` file keyed by the calculator, the uri of the network and
+        a hash of the content of the haplotypes; the next calls with the
+        same key load the file as a read-only memory map instead of
+        calculate the distances again.
+    kwargs :
+        Variable parameters to use as enviroment filters only if ``nw`` is
+        :py:class:`yatel.db.YatelNetwork` instance.
+
+    Returns
+    -------
+    tuple
+        Like ``haps, numpy.ndarray`` where ``haps`` is a tuple with the
+        haplotypes and the array is the condensed distance matrix in the
+        layout of ``scipy.spatial.distance.pdist`` (the distance between
+        ``haps[i]`` and ``haps[j]`` is in the position
+        ``n * i - i * (i + 1) / 2 + j - i - 1`` for ``i < j``).
+
+    Examples
+    --------
+
+    >>> haps, dists = weight.pdist("ham", nw)
+    >>> scipy.spatial.distance.squareform(dists)
+    array([[ 0.,  2.,  2.],
+           [ 2.,  0.,  2.],
+           [ 2.,  2.,  0.]])
+
+    """
+    cls = CALCULATORS[calcname]
+    calculator = cls()
+    haps = tuple(core.haplotypes(nw, env, **kwargs))
+    if store is None:
+        return haps, matrix.pdist(calculator, haps)
+
+    uri = nw.uri if isinstance(nw, db.YatelNetwork) else ""
+    key = hashlib.sha1(
+        "\n".join([uri, matrix.haplotypes_hash(haps)])
+    ).hexdigest()
+    fname = "{}-{}.npy".format(cls.names()[0], key)
+    path = os.path.join(store, fname)
+    return haps, matrix.stored_pdist(calculator, haps, path)
 
 
 #==============================================================================
@@ -20,9 +20,22 @@
 #==============================================================================
 
 import abc
+import heapq
 import itertools
+import multiprocessing
 
-from yatel import db
+import numpy as np
+
+from yatel import db, dom
+from yatel.weight import matrix
+
+
+#==============================================================================
+# CONSTANTS
+#==============================================================================
+
+#: Approximate number of pairs computed by every task of the process pool
+TILE_SIZE = 10000
 
 
 #==============================================================================
@@ -34,6 +47,11 @@ class BaseWeight(object):
 
     __metaclass__ = abc.ABCMeta
 
+    #: If is ``True`` the calculator implements ``encode`` and
+    #: ``weights_block`` and ``weights`` use the vectorized engine of
+    #: :py:mod:`yatel.weight.matrix`
+    vectorized = False
+
     @classmethod
     def names(cls):
         """**Abstract Method.**
@@ -47,7 +65,8 @@ class BaseWeight(object):
         """
         raise NotImplementedError()
 
-    def weights(self, nw, to_same=False, env=None, **kwargs):
+    def weights(self, nw, to_same=False, env=None, n_jobs=1, ordered=True,
+                **kwargs):
         """Calculates the distance between all combinations of existing 
         haplotypes of the network environment or a collection.
         
@@ -65,6 +84,14 @@ class BaseWeight(object):
         env : dict or None
             Enviroment dictionary only if ``nw`` is 
             :py:class:`yatel.db.YatelNetwork` instance.
+        n_jobs : int
+            Number of processes used to compute the weights (``-1`` use all
+            the cpus). The pairs are splitted in tiles of
+            :py:data:`yatel.weight.core.TILE_SIZE` pairs.
+        ordered : bool
+            Only if ``n_jobs`` is not ``1``. If ``False`` the tiles are
+            returned as soon as they are calculated instead of in the order
+            of the combinations.
         kwargs : 
             Variable parameters to use as enviroment filters only if ``nw`` is 
             :py:class:`yatel.db.YatelNetwork` instance.
@@ -76,30 +103,223 @@ class BaseWeight(object):
             ``hap_y`` is the end node and ``float`` is the weight between them.
 
         """
-        env = dict(env) if env else {}
-        env.update(kwargs)
+        haps = haplotypes(nw, env, **kwargs)
 
-        haps = None
-        if isinstance(nw, db.YatelNetwork):
-            haps = (
-                nw.haplotypes_by_environment(env) if env else nw.haplotypes()
-            )
-        elif env:
-            msg = (
-                "If nw is not instance of yatel.db.YatelNetwork, "
-                "env and kwargs must be empty"
-            )
-            raise ValueError(msg)
-        else:
-            haps = nw
+        if n_jobs != 1:
+            for pair, w in parallel_weights(self, haps, to_same, n_jobs,
+                                            ordered):
+                yield pair, w
+            return
 
+        if self.vectorized:
+            for pair, w in matrix.pairs(self, haps, to_same):
+                yield pair, w
+            return
+
+        haps = tuple(haps)
+        encodings = self.encodings(haps)
         comb = (
             itertools.combinations_with_replacement
             if to_same else
             itertools.combinations
         )
         for hap0, hap1 in comb(haps, 2):
-            yield (hap0, hap1), self.weight(hap0, hap1)
+            w = self.encoded_weight(
+                encodings[hap0.hap_id], encodings[hap1.hap_id]
+            )
+            yield (hap0, hap1), w
+
+    def edges(self, nw, max_weight=None, k=None, env=None, **kwargs):
+        """Creates the edges between the haplotypes of the network
+        environment or a collection with weight lower or equal than
+        ``max_weight`` and/or between every haplotype and their ``k``
+        nearest neighbours.
+
+        The haplotypes are sorted by ``projections`` and the pairs that
+        can't be closer than ``max_weight`` (or the k-th neighbour) are
+        discarded without calculate their weight.
+
+        Parameters
+        ----------
+        nw : :py:class:`yatel.db.YatelNetwork` or \
+            :py:class:`yatel.dom.Haplotype`
+            :py:class:`yatel.db.YatelNetwork` instance or iterable of
+            :py:class:`yatel.dom.Haplotype` instances
+        max_weight : float or None
+            The max weight of the edges.
+        k : int or None
+            How many nearest neighbours of every haplotype are connected.
+        env : dict or None
+            Enviroment dictionary only if ``nw`` is
+            :py:class:`yatel.db.YatelNetwork` instance.
+        kwargs :
+            Variable parameters to use as enviroment filters only if ``nw`` is
+            :py:class:`yatel.db.YatelNetwork` instance.
+
+        Returns
+        -------
+        Iterator
+            Of :py:class:`yatel.dom.Edge` (every pair is returned only once).
+
+        """
+        if max_weight is None and k is None:
+            raise ValueError("max_weight or k must be given")
+
+        haps = tuple(haplotypes(nw, env, **kwargs))
+        encodings = self.encodings(haps)
+        encoded = [encodings[hap.hap_id] for hap in haps]
+        keys = np.asarray(self.projections(haps, encodings), np.float64)
+        order = np.argsort(keys, kind="mergesort").tolist()
+        keys = keys.tolist()
+
+        if k is None:
+            pairs = self._threshold_pairs(encoded, keys, order, max_weight)
+        else:
+            pairs = self._knn_pairs(encoded, keys, order, k, max_weight)
+        for (idx, jdx), w in pairs:
+            yield dom.Edge(w, (haps[idx].hap_id, haps[jdx].hap_id))
+
+    def _threshold_pairs(self, encoded, keys, order, max_weight):
+        for pos, idx in enumerate(order):
+            for jdx in order[pos + 1:]:
+                if keys[jdx] - keys[idx] > max_weight:
+                    break
+                w = self.encoded_bounded_weight(
+                    encoded[idx], encoded[jdx], max_weight
+                )
+                if w <= max_weight:
+                    yield (min(idx, jdx), max(idx, jdx)), w
+
+    def _knn_pairs(self, encoded, keys, order, k, max_weight):
+        pairs = {}
+        size = len(order)
+        for pos, idx in enumerate(order):
+            # max-heap of the k nearest as (-weight, -jdx)
+            nearest = []
+            lo, hi = pos - 1, pos + 1
+            while lo >= 0 or hi < size:
+                gap_lo = keys[idx] - keys[order[lo]] if lo >= 0 else None
+                gap_hi = keys[order[hi]] - keys[idx] if hi < size else None
+                if gap_hi is None or (gap_lo is not None and gap_lo <= gap_hi):
+                    gap, jdx, lo = gap_lo, order[lo], lo - 1
+                else:
+                    gap, jdx, hi = gap_hi, order[hi], hi + 1
+                if max_weight is not None and gap > max_weight:
+                    break
+                if len(nearest) == k and gap > -nearest[0][0]:
+                    break
+                bound = max_weight
+                if len(nearest) == k:
+                    bound = -nearest[0][0] if bound is None else \
+                            min(bound, -nearest[0][0])
+                if bound is None:
+                    w = self.encoded_weight(encoded[idx], encoded[jdx])
+                else:
+                    w = self.encoded_bounded_weight(
+                        encoded[idx], encoded[jdx], bound
+                    )
+                if max_weight is not None and w > max_weight:
+                    continue
+                if len(nearest) < k:
+                    heapq.heappush(nearest, (-w, -jdx))
+                elif w < -nearest[0][0]:
+                    heapq.heapreplace(nearest, (-w, -jdx))
+            for negw, negjdx in nearest:
+                jdx = -negjdx
+                pairs[(min(idx, jdx), max(idx, jdx))] = -negw
+        return sorted(pairs.items())
+
+    def bounded_weight(self, hap0, hap1, max_weight):
+        """The weight between 2 :py:class:`yatel.dom.Haplotype` instances if
+        is lower or equal than ``max_weight``; otherwise any value greater
+        than ``max_weight``.
+
+        Calculators that can stop early (like Levenshtein) override
+        ``encoded_bounded_weight``.
+
+        """
+        return self.encoded_bounded_weight(
+            self.encode_hap(hap0), self.encode_hap(hap1), max_weight
+        )
+
+    def encode_hap(self, hap):
+        """Convert a haplotype to the representation used by
+        ``encoded_weight``.
+
+        The default implementation returns the same haplotype.
+
+        """
+        return hap
+
+    def encodings(self, haps):
+        """A dict with the ``encode_hap`` of every haplotype of ``haps`` by
+        ``hap_id``.
+
+        ``weights`` and ``edges`` (and every worker of the pool) create
+        their own dict for the haplotypes of the run, so every haplotype is
+        encoded only once by run and nothing is kept after it.
+
+        """
+        return dict((hap.hap_id, self.encode_hap(hap)) for hap in haps)
+
+    def encoded_weight(self, encoded0, encoded1):
+        """The weight between 2 haplotypes already converted with
+        ``encode_hap``.
+
+        The default implementation returns the ``weight`` (``encode_hap``
+        returns the same haplotype by default).
+
+        """
+        return self.weight(encoded0, encoded1)
+
+    def encoded_bounded_weight(self, encoded0, encoded1, max_weight):
+        """Like ``bounded_weight`` but with 2 haplotypes already converted
+        with ``encode_hap``.
+
+        The default implementation returns the ``encoded_weight``.
+
+        """
+        return self.encoded_weight(encoded0, encoded1)
+
+    def projections(self, haps, encodings=None):
+        """A number for every haplotype of ``haps`` such that the difference
+        between the numbers of two haplotypes is never greater than their
+        weight. Is used by ``edges`` to discard pairs.
+
+        ``encodings`` is the dict of ``encodings`` of ``haps`` if is already
+        created (the calculators that need them create it otherwise).
+
+        The default implementation returns ``0`` for all the haplotypes
+        (nothing is discarded).
+
+        """
+        return np.zeros(len(haps))
+
+    def encode(self, hmatrix):
+        """**Only for vectorized calculators.**
+
+        Convert a :py:class:`yatel.weight.matrix.HaplotypesMatrix` to the
+        numpy matrix used by ``weights_block``.
+
+        Raises
+        ------
+            NotImplementedError
+
+        """
+        raise NotImplementedError()
+
+    def weights_block(self, encoded, start, stop, cstart=0):
+        """**Only for vectorized calculators.**
+
+        A numpy array with the distances of the rows ``start:stop`` of the
+        ``encoded`` matrix against all the rows from ``cstart``.
+
+        Raises
+        ------
+            NotImplementedError
+
+        """
+        raise NotImplementedError()
 
     @abc.abstractmethod
     def weight(self, hap0, hap1):
@@ -111,6 +331,123 @@ class BaseWeight(object):
         raise NotImplementedError()
 
 
+#==============================================================================
+# FUNCTIONS
+#==============================================================================
+
+def haplotypes(nw, env=None, **kwargs):
+    """The haplotypes of the network environment or the same collection if
+    ``nw`` is not a :py:class:`yatel.db.YatelNetwork`.
+
+    """
+    env = dict(env) if env else {}
+    env.update(kwargs)
+
+    if isinstance(nw, db.YatelNetwork):
+        return nw.haplotypes_by_environment(env) if env else nw.haplotypes()
+    elif env:
+        msg = (
+            "If nw is not instance of yatel.db.YatelNetwork, "
+            "env and kwargs must be empty"
+        )
+        raise ValueError(msg)
+    return nw
+
+
+def tiles(size, to_same=False, tile_size=TILE_SIZE):
+    """Split the rows of the combinations of ``size`` elements in ranges
+    ``(start, stop)`` of approximately ``tile_size`` pairs.
+
+    """
+    offset = 0 if to_same else 1
+    start, pairs = 0, 0
+    for idx in xrange(size):
+        pairs += size - idx - offset
+        if pairs >= tile_size:
+            yield start, idx + 1
+            start, pairs = idx + 1, 0
+    if start < size:
+        yield start, size
+
+
+#==============================================================================
+# PARALLEL
+#==============================================================================
+
+# the state of every worker of the pool: (calculator, haps, encoded) where
+# encoded is the encoded matrix of the vectorized calculators or the list of
+# the encode_hap of every haplotype
+_worker = None
+
+
+def _init_worker(calculator, haps):
+    global _worker
+    if calculator.vectorized:
+        encoded = calculator.encode(matrix.HaplotypesMatrix(haps))
+    else:
+        encodings = calculator.encodings(haps)
+        encoded = [encodings[hap.hap_id] for hap in haps]
+    _worker = (calculator, haps, encoded)
+
+
+def _tile_weights(tile):
+    """Compute the weights of the rows ``start:stop`` of the combinations
+    in a worker of the pool.
+
+    """
+    start, stop, to_same = tile
+    calculator, haps, encoded = _worker
+    offset = 0 if to_same else 1
+    if calculator.vectorized:
+        blocks = matrix.blocks(calculator, encoded, to_same, start, stop)
+        return list(blocks)
+    return [
+        (idx, [calculator.encoded_weight(encoded[idx], encoded1)
+               for encoded1 in encoded[idx + offset:]])
+        for idx in xrange(start, stop)
+    ]
+
+
+def parallel_weights(calculator, haps, to_same=False, n_jobs=-1,
+                     ordered=True):
+    """Calculates the distance between all combinations of ``haps`` in a
+    pool of ``n_jobs`` processes (``-1`` use all the cpus).
+
+    The haplotypes and the calculator are shared with the workers when the
+    pool is created, so only the indexes and the weights are sended between
+    processes.
+
+    Returns
+    -------
+    Iterator
+        Like ``(hap_x, hap_y), float``. If ``ordered`` is ``True`` in the
+        same order of ``BaseWeight.weights``.
+
+    """
+    haps = tuple(haps)
+    n_jobs = multiprocessing.cpu_count() if n_jobs < 0 else n_jobs
+    offset = 0 if to_same else 1
+
+    pool = multiprocessing.Pool(
+        n_jobs, initializer=_init_worker, initargs=(calculator, haps)
+    )
+    try:
+        tasks = (
+            (start, stop, to_same)
+            for start, stop in tiles(len(haps), to_same, TILE_SIZE)
+        )
+        imap = pool.imap if ordered else pool.imap_unordered
+        for rows in imap(_tile_weights, tasks):
+            for idx, dists in rows:
+                hap0 = haps[idx]
+                for jdx, w in enumerate(dists, idx + offset):
+                    yield (hap0, haps[jdx]), w
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
 #==============================================================================
 # MAIN
 #==============================================================================
@@ -24,7 +24,7 @@
 
 import numpy as np
 
-from yatel.weight import core
+from yatel.weight import core, matrix
 
 
 #==============================================================================
@@ -61,6 +61,8 @@ class Euclidean(core.BaseWeight):
         """
         return "euclidean", "euc", "ordinary"
 
+    vectorized = True
+
     def __init__(self, to_num=None):
         """Creates a new instance.
 
@@ -87,13 +89,45 @@ class Euclidean(core.BaseWeight):
     def weight(self, hap0, hap1):
         """A ``float`` distance between 2 :py:class:`yatel.dom.Haplotype` 
         instances"""
+        encoded0, encoded1 = self.encode_hap(hap0), self.encode_hap(hap1)
+        return self.encoded_weight(encoded0, encoded1)
+
+    def encoded_weight(self, nums0, nums1):
+        """The distance between the ``encode_hap`` of 2 haplotypes."""
+        missing = None
         s = 0.0
-        for name in set(hap0.keys() + hap1.keys()):
-            v0 = self.to_num(hap0.get(name, ""))
-            v1 = self.to_num(hap1.get(name, ""))
+        for name in set(nums0.keys() + nums1.keys()):
+            if name not in nums0 or name not in nums1:
+                missing = self.to_num("") if missing is None else missing
+            v0 = nums0.get(name, missing)
+            v1 = nums1.get(name, missing)
             s += (v1 - v0) ** 2
         return np.sqrt(s)
 
+    def encode_hap(self, hap):
+        """The attributes of the haplotype converted with ``to_num``."""
+        return dict((k, self.to_num(v)) for k, v in hap.items())
+
+    def projections(self, haps, encodings=None):
+        """The projection of every haplotype (converted with ``to_num``) over
+        the unit diagonal vector; never greater than the distance by the
+        Cauchy-Schwarz inequality.
+
+        """
+        nums = matrix.HaplotypesMatrix(haps).to_num(self.to_num)
+        return nums.sum(axis=1) / np.sqrt(max(nums.shape[1], 1))
+
+    def encode(self, hmatrix):
+        """The haplotypes attributes converted with ``to_num``."""
+        return hmatrix.to_num(self.to_num)
+
+    def weights_block(self, encoded, start, stop, cstart=0):
+        """The distances of the haplotypes ``start:stop`` against all the
+        haplotypes from ``cstart``.
+
+        """
+        return matrix.euclidean_block(encoded, start, stop, cstart)
+
 
 #==============================================================================
 # FUNCTION
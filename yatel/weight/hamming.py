@@ -22,7 +22,9 @@
 # IMPORTS
 #==============================================================================
 
-from yatel.weight import core
+import numpy as np
+
+from yatel.weight import core, matrix
 
 
 #==============================================================================
@@ -38,6 +40,10 @@ class Hamming(core.BaseWeight):
         #. haplotype0.attr_a != haplotype1.attr_a
         #. attr_a exist in haplotype0 but not exist in haplotype1.
 
+    Every haplotype is encoded once as the frozen sets of his attribute
+    names and his ``(name, value)`` items, so the distance is the number of
+    names of both haplotypes minus the number of shared items.
+
     Examples
     --------
 
@@ -57,16 +63,50 @@ class Hamming(core.BaseWeight):
         """
         return "hamming", "ham"
 
+    vectorized = True
+
     def weight(self, hap0, hap1):
         """A ``float`` distance between 2 :py:class:`dom.Haplotype` 
         instances"""
-        w = 0
-        for name in set(hap0.keys() + hap1.keys()):
-            if name not in hap0.keys() \
-               or name not in hap1.keys() \
-               or hap0.get(name) != hap1.get(name):
-                w += 1
-        return w
+        encoded0, encoded1 = self.encode_hap(hap0), self.encode_hap(hap1)
+        return self.encoded_weight(encoded0, encoded1)
+
+    def encoded_weight(self, encoded0, encoded1):
+        """The distance between the ``encode_hap`` of 2 haplotypes."""
+        names0, items0 = encoded0
+        names1, items1 = encoded1
+        return len(names0 | names1) - len(items0 & items1)
+
+    def encode_hap(self, hap):
+        """The frozen sets of the attribute names and the ``(name, value)``
+        items of the haplotype.
+
+        """
+        return frozenset(hap.keys()), frozenset(hap.items())
+
+    def projections(self, haps, encodings=None):
+        """The number of attributes of every haplotype (every attribute
+        that only exist in one of the haplotypes add 1 to the distance).
+
+        """
+        return [len(hap) for hap in haps]
+
+    def encode(self, hmatrix):
+        """The categorical codes of the haplotypes attributes with the
+        smallest integer type that can hold them (less memory to compare
+        in every block).
+
+        """
+        ncodes = max([len(c) for c in hmatrix.categories] or [1])
+        dtype = np.result_type(np.int8, np.min_scalar_type(-ncodes))
+        return hmatrix.codes.astype(dtype)
+
+    def weights_block(self, encoded, start, stop, cstart=0):
+        """The distances of the haplotypes ``start:stop`` against all the
+        haplotypes from ``cstart``.
+
+        """
+        return matrix.hamming_block(encoded, start, stop, cstart)
 
 #==============================================================================
 # MAIN
@@ -23,6 +23,8 @@
 # IMPORTS
 #==============================================================================
 
+from array import array
+
 from yatel.weight import core
 
 
@@ -61,37 +63,79 @@ class Levenshtein(core.BaseWeight):
         """
         self.to_seq = to_seq_default if to_seq is None else to_seq
 
+    def encode_hap(self, hap):
+        """The attributes of the haplotype converted with ``to_seq``."""
+        return dict((k, self.to_seq(v)) for k, v in hap.items())
+
+    def sequences(self, seqs0, seqs1):
+        """Iterates over the pairs of sequences of every attribute of the
+        ``encode_hap`` of 2 haplotypes sorted by attribute name.
+
+        """
+        missing = None
+        for name in sorted(set(seqs0.keys() + seqs1.keys())):
+            if name not in seqs0 or name not in seqs1:
+                missing = self.to_seq(None) if missing is None else missing
+            yield seqs0.get(name, missing), seqs1.get(name, missing)
+
+    def projections(self, haps, encodings=None):
+        """The total length of the attributes of every haplotype as
+        sequences (the distance of every attribute is at least the
+        difference of their lengths).
+
+        The attributes of ``haps`` that a haplotype doesn't have are
+        counted with the length of ``to_seq(None)`` as ``sequences``
+        compares them.
+
+        """
+        haps = tuple(haps)
+        if encodings is None:
+            encodings = self.encodings(haps)
+        names = set()
+        for hap in haps:
+            names.update(encodings[hap.hap_id])
+        missing = len(self.to_seq(None))
+        return [
+            sum(len(seq) for seq in encodings[hap.hap_id].values()) +
+            missing * (len(names) - len(encodings[hap.hap_id]))
+            for hap in haps
+        ]
+
+    def distance(self, seq0, seq1, max_distance=None):
+        """The distance between 2 sequences (see
+        :py:func:`yatel.weight.levenshtein.levenshtein`).
+
+        """
+        return levenshtein(seq0, seq1, max_distance)
+
     def weight(self, hap0, hap1):
         """A ``float`` distance between 2 :py:class:`dom.Haplotype` instances
         
         """
-        def levenshtein(a, b):
-            """Calculates the Levenshtein distance between a and b.
-
-            Found at: http://hetland.org/coding/
-            
-            """
-            n, m = len(a), len(b)
-            if n > m:
-                # Make sure n <= m, to use O(min(n,m)) space
-                a, b = b, a
-                n, m = m, n
-            current = range(n + 1)
-            for i in range(1, m + 1):
-                previous, current = current, [i] + [0] * n
-                for j in range(1, n + 1):
-                    add, delete = previous[j] + 1, current[j - 1] + 1
-                    change = previous[j - 1]
-                    if a[j - 1] != b[i - 1]:
-                        change = change + 1
-                    current[j] = min(add, delete, change)
-            return current[n]
+        encoded0, encoded1 = self.encode_hap(hap0), self.encode_hap(hap1)
+        return self.encoded_weight(encoded0, encoded1)
 
+    def encoded_weight(self, seqs0, seqs1):
+        """The distance between the ``encode_hap`` of 2 haplotypes."""
         value = 0
-        for name in sorted(set(hap0.keys() + hap1.keys())):
-            as0 = self.to_seq(hap0.get(name))
-            as1 = self.to_seq(hap1.get(name))
-            value += levenshtein(as0, as1)
+        for as0, as1 in self.sequences(seqs0, seqs1):
+            value += self.distance(as0, as1)
+        return value
+
+    def encoded_bounded_weight(self, seqs0, seqs1, max_weight):
+        """The distance between the ``encode_hap`` of 2 haplotypes if is
+        lower or equal than ``max_weight``; otherwise any value greater than
+        ``max_weight``.
+
+        Every attribute is compared with the remaining budget of edits and
+        the calculation stops as soon as the budget is exceeded.
+
+        """
+        value = 0
+        for as0, as1 in self.sequences(seqs0, seqs1):
+            value += self.distance(as0, as1, int(max_weight - value))
+            if value > max_weight:
+                break
         return value
 
 
@@ -123,61 +167,126 @@ class DamerauLevenshtein(Levenshtein):
         """        
         return "dameraulevenshtein", "damlev", "damerau-levenshtein"
 
-    def weight(self, hap0, hap1):
-        """A ``float`` distance between 2 `dom.Haplotype` instances
-        
-        """
-        def dameraulevenshtein(seq1, seq2):
-            """This is the original code found in:
-
-            http://mwh.geek.nz/2009/04/26/python-damerau-levenshtein-distance/
-
-            The code is available under the MIT licence, in the hope that it
-            will be useful, but without warranty of any kind. I have also
-            included a codesnippet  GUID in line with the linked post, as a
-            sort of experiment. Please leave that comment intact if you’re
-            posting a derivative somewhere, and add your own.
-
-            """
-            # codesnippet:D0DE4716-B6E6-4161-9219-2903BF8F547F
-            # Conceptually, this is based on a len(seq1) + 1 * len(seq2) + 1
-            # matrix.
-            # However, only the current and two previous rows are needed at
-            # once, so we only store those.
-            oneago = None
-            thisrow = range(1, len(seq2) + 1) + [0]
-            for x in xrange(len(seq1)):
-                # Python lists wrap around for negative indices, so put the
-                # leftmost column at the *end* of the list. This matches with
-                # the zero-indexed strings and saves extra calculation.
-                twoago, oneago, thisrow = (
-                    oneago, thisrow, [0] * len(seq2) + [x + 1]
-                )
-                for y in xrange(len(seq2)):
-                    delcost = oneago[y] + 1
-                    addcost = thisrow[y - 1] + 1
-                    subcost = oneago[y - 1] + (seq1[x] != seq2[y])
-                    thisrow[y] = min(delcost, addcost, subcost)
-                    # This block deals with transpositions
-                    if (
-                        x > 0 and y > 0 and seq1[x] == seq2[y - 1]
-                        and seq1[x - 1] == seq2[y] and seq1[x] != seq2[y]
-                    ):
-                        thisrow[y] = min(thisrow[y], twoago[y - 2] + 1)
-            return thisrow[len(seq2) - 1]
+    def distance(self, seq0, seq1, max_distance=None):
+        """The distance between 2 sequences (see
+        :py:func:`yatel.weight.levenshtein.dameraulevenshtein`).
 
-        value = 0
-        for name in sorted(set(hap0.keys() + hap1.keys())):
-            as0 = self.to_seq(hap0.get(name))
-            as1 = self.to_seq(hap1.get(name))
-            value += dameraulevenshtein(as0, as1)
-        return value
+        """
+        return dameraulevenshtein(seq0, seq1, max_distance)
 
 
 #==============================================================================
 # FUNCTIONS
 #==============================================================================
 
+def levenshtein(a, b, max_distance=None):
+    """Calculates the Levenshtein distance between a and b.
+
+    Based on: http://hetland.org/coding/
+
+    If ``max_distance`` is given only the diagonal band of width
+    ``2 * max_distance + 1`` of the table is calculated (Ukkonen) and the
+    calculation stops as soon as the distance is known to be greater than
+    ``max_distance``; in that case ``max_distance + 1`` is returned.
+
+    """
+    n, m = len(a), len(b)
+    if n > m:
+        # Make sure n <= m, to use O(min(n,m)) space
+        a, b = b, a
+        n, m = m, n
+    if max_distance is None:
+        max_distance = m
+    elif m - n > max_distance:
+        return max_distance + 1
+    exceeded = max_distance + 1
+
+    # the cells out of the band are greater than any distance
+    inf = m + 1
+    previous = array("i", xrange(n + 1))
+    current = array("i", [inf]) * (n + 1)
+    for i in xrange(1, m + 1):
+        lo, hi = max(1, i - max_distance), min(n, i + max_distance)
+        current[lo - 1] = i if lo == 1 else inf
+        row_min = current[lo - 1]
+        bi = b[i - 1]
+        for j in xrange(lo, hi + 1):
+            value = previous[j - 1]
+            if a[j - 1] != bi:
+                value += 1
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if hi < n:
+            current[hi + 1] = inf
+        if row_min > max_distance:
+            return exceeded
+        previous, current = current, previous
+    return min(previous[n], exceeded)
+
+
+def dameraulevenshtein(seq1, seq2, max_distance=None):
+    """Calculates the Damerau-Levenshtein distance (as optimal string
+    alignment) between seq1 and seq2.
+
+    Based on the code found in:
+    http://mwh.geek.nz/2009/04/26/python-damerau-levenshtein-distance/
+    (codesnippet:D0DE4716-B6E6-4161-9219-2903BF8F547F) available under the
+    MIT licence.
+
+    If ``max_distance`` is given only the diagonal band of width
+    ``2 * max_distance + 1`` of the table is calculated (Ukkonen) and the
+    calculation stops as soon as the distance is known to be greater than
+    ``max_distance``; in that case ``max_distance + 1`` is returned.
+
+    """
+    n, m = len(seq1), len(seq2)
+    if max_distance is None:
+        max_distance = max(n, m)
+    elif abs(n - m) > max_distance:
+        return max_distance + 1
+    exceeded = max_distance + 1
+    if not n or not m:
+        return min(max(n, m), exceeded)
+
+    # the cells out of the band are greater than any distance
+    inf = n + m + 1
+    # only the current and two previous rows are needed at once
+    twoago = array("i", [inf]) * (m + 1)
+    oneago = array("i", xrange(m + 1))
+    thisrow = array("i", [inf]) * (m + 1)
+    for x in xrange(1, n + 1):
+        lo, hi = max(1, x - max_distance), min(m, x + max_distance)
+        thisrow[lo - 1] = row_min = x if lo == 1 else inf
+        s1 = seq1[x - 1]
+        for y in xrange(lo, hi + 1):
+            s2 = seq2[y - 1]
+            value = oneago[y - 1]
+            if s1 != s2:
+                value += 1
+                # transpositions
+                if x > 1 and y > 1 and s1 == seq2[y - 2] and \
+                   seq1[x - 2] == s2 and twoago[y - 2] + 1 < value:
+                    value = twoago[y - 2] + 1
+            if oneago[y] + 1 < value:
+                value = oneago[y] + 1
+            if thisrow[y - 1] + 1 < value:
+                value = thisrow[y - 1] + 1
+            thisrow[y] = value
+            if value < row_min:
+                row_min = value
+        if hi < m:
+            thisrow[hi + 1] = inf
+        if row_min > max_distance:
+            return exceeded
+        twoago, oneago, thisrow = oneago, thisrow, twoago
+    return min(oneago[m], exceeded)
+
+
 def to_seq_default(obj):
     """Converts a given object to a normalized base64 of self.
 
@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# "THE WISKEY-WARE LICENSE":
+# <utn_kdd@googlegroups.com> wrote this file. As long as you retain this notice
+# you can do whatever you want with this stuff. If we meet some day, and you
+# think this stuff is worth it, you can buy us a WISKEY us return.
+
+
+#==============================================================================
+# DOCS
+#==============================================================================
+
+"""Vectorized engine to calculate the distances between all the pairs of a
+collection of haplotypes.
+
+The haplotypes are encoded once in a numpy matrix (one row by haplotype, one
+column by attribute) and the calculators that support it compute the
+distances between blocks of rows with broadcasting.
+
+"""
+
+#==============================================================================
+# IMPORTS
+#==============================================================================
+
+import os
+import hashlib
+import tempfile
+import itertools
+
+import numpy as np
+
+
+#==============================================================================
+# CONSTANTS
+#==============================================================================
+
+#: The code of the attributes that a haplotype doesn't have
+MISSING = -1
+
+#: Max number of cells (rows * haplotypes * attributes) of the temporary
+#: arrays created to compute a block of distances
+BLOCK_CELLS = 2 ** 21
+
+
+#==============================================================================
+# HAPLOTYPES MATRIX
+#==============================================================================
+
+class HaplotypesMatrix(object):
+    """Encode a collection of :py:class:`yatel.dom.Haplotype` as a matrix
+    of categorical codes.
+
+    Every column is an attribute (including ``hap_id``) and every distinct
+    value of the column have a code; the missing attributes are
+    :py:data:`yatel.weight.matrix.MISSING`.
+
+    Examples
+    --------
+
+    >>> from yatel import dom
+    >>> hmatrix = HaplotypesMatrix([dom.Haplotype(1, a="x"),
+    ...                             dom.Haplotype(2, a="y", b=1)])
+    >>> hmatrix.names
+    ('a', 'b', 'hap_id')
+    >>> hmatrix.codes
+    array([[ 0, -1,  0],
+           [ 1,  0,  1]])
+
+    """
+
+    def __init__(self, haps):
+        self.haps = tuple(haps)
+        self.names = tuple(sorted(set(
+            name for hap in self.haps for name in hap.keys()
+        )))
+        self.codes = np.empty((len(self.haps), len(self.names)), np.int64)
+        self.categories = []
+        for col, name in enumerate(self.names):
+            categories = {}
+            for row, hap in enumerate(self.haps):
+                if name in hap:
+                    value = hap[name]
+                    code = categories.setdefault(value, len(categories))
+                else:
+                    code = MISSING
+                self.codes[row, col] = code
+            self.categories.append(
+                tuple(sorted(categories, key=categories.get))
+            )
+
+    def __len__(self):
+        return len(self.haps)
+
+    @property
+    def missing(self):
+        """A boolean matrix with ``True`` where the attribute is missing."""
+        return self.codes == MISSING
+
+    def to_num(self, func, default=""):
+        """Convert every value of the haplotypes to a float with ``func``.
+
+        ``func`` is called only once by distinct value (values of different
+        types like ``1`` and ``1.0`` are converted separately), and the
+        missing values are converted as ``func(default)``.
+
+        """
+        nums = np.empty(self.codes.shape, np.float64)
+        cache = {}
+        for row, hap in enumerate(self.haps):
+            for col, name in enumerate(self.names):
+                value = hap.get(name, default)
+                key = (type(value), value)
+                if key not in cache:
+                    cache[key] = func(value)
+                nums[row, col] = cache[key]
+        return nums
+
+
+#==============================================================================
+# FUNCTIONS
+#==============================================================================
+
+def block_size(encoded):
+    """How many rows of the ``encoded`` matrix can be compared against all
+    the rows without exceed :py:data:`yatel.weight.matrix.BLOCK_CELLS`.
+
+    """
+    cells = max(encoded.shape[0] * encoded.shape[1], 1)
+    return max(BLOCK_CELLS // cells, 1)
+
+
+def hamming_block(codes, start, stop, cstart=0):
+    """The hamming distance of the rows ``start:stop`` of ``codes``
+    against all the rows from ``cstart``.
+
+    """
+    return (codes[start:stop, None, :] != codes[None, cstart:, :]).sum(axis=2)
+
+
+def euclidean_block(nums, start, stop, cstart=0):
+    """The euclidean distance of the rows ``start:stop`` of ``nums``
+    against all the rows from ``cstart``.
+
+    """
+    diff = nums[start:stop, None, :] - nums[None, cstart:, :]
+    return np.sqrt((diff * diff).sum(axis=2))
+
+
+def blocks(calculator, encoded, to_same=False, start=0, stop=None):
+    """Iterates over the distances of every row (or the rows
+    ``start:stop``) of the ``encoded`` matrix against the next ones (and
+    itself if ``to_same`` is ``True``).
+
+    Every block of rows is compared only against the rows from the first
+    one of the block (the previous rows are never used).
+
+    Returns
+    -------
+    Iterator
+        Like ``idx, numpy.ndarray`` where ``idx`` is the index of the row and
+        the array has the distances in the order of
+        ``itertools.combinations`` (or
+        ``itertools.combinations_with_replacement``).
+
+    """
+    size = block_size(encoded)
+    offset = 0 if to_same else 1
+    stop = encoded.shape[0] if stop is None else stop
+    for bstart in xrange(start, stop, size):
+        bstop = min(bstart + size, stop)
+        cstart = bstart + offset
+        block = calculator.weights_block(encoded, bstart, bstop, cstart)
+        for idx in xrange(bstart, bstop):
+            yield idx, block[idx - bstart, idx + offset - cstart:]
+
+
+def pdist(calculator, haps, empty=np.empty):
+    """Calculates the distances between all the pairs of ``haps``.
+
+    If the calculator doesn't support the vectorized engine the distances
+    are calculated pair by pair.
+
+    Parameters
+    ----------
+    calculator : :py:class:`yatel.weight.core.BaseWeight`
+        The calculator of the distances.
+    haps : iterable
+        Of :py:class:`yatel.dom.Haplotype`.
+    empty : callable
+        Creates the result array with the signature of ``numpy.empty``.
+
+    Returns
+    -------
+    numpy.ndarray
+        The condensed distance matrix in the same layout of
+        ``scipy.spatial.distance.pdist``.
+
+    """
+    haps = tuple(haps)
+    size = len(haps) * (len(haps) - 1) // 2
+
+    if not calculator.vectorized:
+        condensed = empty(size, np.float64)
+        encodings = calculator.encodings(haps)
+        encoded = [encodings[hap.hap_id] for hap in haps]
+        pairs = itertools.combinations(encoded, 2)
+        for pos, (encoded0, encoded1) in enumerate(pairs):
+            condensed[pos] = calculator.encoded_weight(encoded0, encoded1)
+        return condensed
+
+    encoded = calculator.encode(HaplotypesMatrix(haps))
+    dtype = calculator.weights_block(encoded, 0, 0).dtype
+    condensed = empty(size, dtype)
+    pos = 0
+    for idx, dists in blocks(calculator, encoded):
+        condensed[pos:pos + len(dists)] = dists
+        pos += len(dists)
+    return condensed
+
+
+def haplotypes_hash(haps):
+    """A hash of the content (and order) of a collection of
+    :py:class:`yatel.dom.Haplotype`.
+
+    """
+    digest = hashlib.sha1()
+    for hap in haps:
+        digest.update(repr(sorted(hap.items())))
+        digest.update("\n")
+    return digest.hexdigest()
+
+
+def stored_pdist(calculator, haps, path):
+    """Like :py:func:`yatel.weight.matrix.pdist` but the result is stored in
+    the ``.npy`` file ``path``; if the file already exists is loaded
+    without calculate anything.
+
+    Returns
+    -------
+    numpy.ndarray
+        A read-only memory map of the condensed distance matrix.
+
+    """
+    if not os.path.exists(path):
+        dirname = os.path.dirname(path) or "."
+        fd, tmp_path = tempfile.mkstemp(suffix=".npy", dir=dirname)
+        os.close(fd)
+        try:
+            def empty(size, dtype):
+                return np.lib.format.open_memmap(
+                    tmp_path, mode="w+", dtype=dtype, shape=(size,)
+                )
+            condensed = pdist(calculator, haps, empty)
+            condensed.flush()
+            del condensed
+            os.rename(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return np.load(path, mmap_mode="r")
+
+
+def pairs(calculator, haps, to_same=False):
+    """Iterates over the distances between all the pairs of ``haps`` with a
+    calculator that support the vectorized engine.
+
+    Returns
+    -------
+    Iterator
+        Like ``(hap_x, hap_y), weight`` in the same order of
+        :py:meth:`yatel.weight.core.BaseWeight.weights`. The weights are
+        numpy scalars of the ``dtype`` of ``weights_block``.
+
+    """
+    hmatrix = HaplotypesMatrix(haps)
+    encoded = calculator.encode(hmatrix)
+    haps = hmatrix.haps
+    offset = 0 if to_same else 1
+    for idx, dists in blocks(calculator, encoded, to_same):
+        hap0 = haps[idx]
+        for jdx, w in enumerate(dists, idx + offset):
+            yield (hap0, haps[jdx]), w
+
+
+#==============================================================================
+# MAIN
+#==============================================================================
+
+if __name__ == "__main__":
+    print(__doc__)